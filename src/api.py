@@ -1,20 +1,34 @@
 from flask import Flask, request, jsonify, Response, stream_with_context
 from scanner import ShareScanner
-from ldap_helper import LDAPHelper
-from db_helper import DatabaseHelper
+from ldap_helper import LDAPConnectionPool
+from db_helper import get_shared_db_helper
 from config import Config
+from credential_store import store_credentials, get_credentials, delete_credentials
+from scan_store import get_scan, save_scan, update_scan_status, update_scan_progress, cleanup_old_scans, SCAN_CLEANUP_INTERVAL
 from typing import Optional
 import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from flask_cors import CORS
 import time
-import json
+import orjson
 import os
+import uuid
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.executors.pool import ThreadPoolExecutor as SchedulerThreadPoolExecutor
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy.engine import URL
+from apscheduler.events import (
+    EVENT_JOB_ADDED, EVENT_JOB_REMOVED, EVENT_JOB_MODIFIED,
+    EVENT_JOB_SUBMITTED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED, EVENT_ALL_JOBS_REMOVED
+)
 import logging
 import traceback
-from queue import Queue, Empty
+from collections import deque
+import weakref
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -25,99 +39,153 @@ CORS(app, resources={
     }
 })
 
-# Use a file-based storage for active scans
-SCANS_FILE = "active_scans.json"
-SCAN_RETENTION_HOURS = 24
+PROGRESS_UPDATE_INTERVAL = 0.2  # seconds between published progress updates
+SSE_BUFFER_SIZE = 1024  # frames buffered per SSE subscriber
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _jobstore_url():
+    """Scheduled jobs live in the scanner's Postgres database unless SCHEDULER_DB_URL is set"""
+    if os.getenv("SCHEDULER_DB_URL"):
+        return os.getenv("SCHEDULER_DB_URL")
+    db_config = Config()
+    return URL.create(
+        "postgresql+psycopg2",
+        username=db_config.DB_USER,
+        password=db_config.DB_PASSWORD,
+        host=db_config.DB_HOST,
+        port=db_config.DB_PORT,
+        database=db_config.DB_NAME
+    )
+
+SCHEDULER_START_BASE_DELAY = 1  # seconds before the first scheduler start retry
+SCHEDULER_START_MAX_DELAY = 60  # cap on the delay between start retries
+
 # Initialize scheduler with SQLAlchemy job store and proper error handling
 try:
     jobstores = {
-        'default': SQLAlchemyJobStore(url='sqlite:///jobs.db')
+        'default': SQLAlchemyJobStore(
+            url=_jobstore_url(),
+            engine_options={'pool_size': 5, 'pool_pre_ping': True}
+        )
     }
-    scheduler = BackgroundScheduler(jobstores=jobstores)
-    scheduler.start()
-    logger.info("Scheduler started successfully")
+    executors = {
+        'default': SchedulerThreadPoolExecutor(4),
+        # Scheduled scans hold a thread for the whole scan; keep them off the default pool
+        'scans': SchedulerThreadPoolExecutor(int(os.getenv("SCHEDULED_SCAN_WORKERS", "2")))
+    }
+    job_defaults = {
+        'coalesce': True,  # Run a missed backlog once, not once per missed slot
+        'max_instances': 1,  # Never overlap two runs of the same scheduled scan
+        'misfire_grace_time': 3600  # Still run a scan that was due up to an hour ago
+    }
+    scheduler = BackgroundScheduler(jobstores=jobstores, executors=executors, job_defaults=job_defaults)
 except Exception as e:
     logger.error(f"Failed to initialize scheduler: {str(e)}")
     logger.error(traceback.format_exc())
+    scheduler = None  # Schedule endpoints answer 503; scans and SSE keep working
+
+# Process-local maintenance jobs (heartbeat, cleanup) run on their own
+# in-memory scheduler so they don't wait for Postgres to come up
+maintenance_scheduler = BackgroundScheduler(
+    jobstores={'default': MemoryJobStore()},
+    executors={'default': SchedulerThreadPoolExecutor(4)}
+)
+
+class Subscriber:
+    """Buffer of ready-to-send SSE frames for one connected client"""
+
+    __slots__ = ('buf', 'ready', '__weakref__')
+
+    def __init__(self):
+        # Bounded so a stalled client drops its oldest frames instead of growing
+        self.buf = deque(maxlen=SSE_BUFFER_SIZE)
+        self.ready = threading.Event()
+
+    def put(self, payload: bytes) -> None:
+        self.buf.append(payload)
+        self.ready.set()
+
+    def drain(self, timeout: Optional[float] = None) -> list:
+        """Wait up to timeout seconds (forever if None) for events and return all buffered ones"""
+        self.ready.wait(timeout)
+        # Clear before draining so a frame put during the drain re-arms the event
+        self.ready.clear()
+        drained = []
+        while self.buf:
+            drained.append(self.buf.popleft())
+        return drained
 
 # Add this near your other global variables
-SUBSCRIBERS = set()
-
-def load_scans():
-    """Load scans from file"""
-    try:
-        if os.path.exists(SCANS_FILE):
-            with open(SCANS_FILE, 'r') as f:
-                scans = json.load(f)
-                # Convert string timestamps back to datetime objects
-                for scan_id in scans:
-                    if 'timestamp' in scans[scan_id]:
-                        scans[scan_id]['timestamp'] = datetime.fromisoformat(scans[scan_id]['timestamp'])
-                return scans
-    except Exception as e:
-        print(f"Error loading scans: {e}")
-    return {}
-
-def save_scans(scans):
-    """Save scans to file"""
-    try:
-        # Convert datetime objects to ISO format strings
-        scans_to_save = {}
-        for scan_id, scan_data in scans.items():
-            scans_to_save[scan_id] = scan_data.copy()
-            if 'timestamp' in scans_to_save[scan_id]:
-                scans_to_save[scan_id]['timestamp'] = scans_to_save[scan_id]['timestamp'].isoformat()
-        
-        with open(SCANS_FILE, 'w') as f:
-            json.dump(scans_to_save, f)
-    except Exception as e:
-        print(f"Error saving scans: {e}")
-
-def cleanup_old_scans():
-    """Remove scan data older than SCAN_RETENTION_HOURS"""
-    scans = load_scans()
-    current_time = datetime.now()
-    expired_scans = [
-        scan_id for scan_id, scan_data in scans.items()
-        if (current_time - scan_data.get('timestamp', current_time)).total_seconds() > SCAN_RETENTION_HOURS * 3600
-    ]
-    if expired_scans:
-        for scan_id in expired_scans:
-            scans.pop(scan_id, None)
-        save_scans(scans)
-
-def update_scan_status(scan_id, status_data):
-    scans = load_scans()
-    if scan_id in scans:
-        scans[scan_id].update(status_data)
-        if 'timestamp' not in scans[scan_id]:
-            scans[scan_id]['timestamp'] = datetime.now()
-        save_scans(scans)
+# Weak so a client whose stream is abandoned without cleanup is dropped by GC
+SUBSCRIBERS = weakref.WeakSet()
+_HEARTBEAT = b'data: {"type":"heartbeat"}\n\n'
+_CONNECTED = b'data: {"type":"connected"}\n\n'
+SSE_HEARTBEAT_INTERVAL = 25  # seconds
+
+# Bounded pool for API-triggered scans; extra requests queue instead of spawning threads
+SCAN_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SCAN_WORKERS", "4")),
+    thread_name_prefix="scan"
+)
+atexit.register(SCAN_EXECUTOR.shutdown, wait=True)
+_SCAN_FUTURES = {}
+# Running plus queued API scans; beyond this start_scan answers 429
+SCAN_MAX_PENDING = int(os.getenv("SCAN_MAX_PENDING", "16"))
+_SCAN_SLOTS = threading.BoundedSemaphore(SCAN_MAX_PENDING)
+
+# Bound LDAP connections and DB pools are reused across scans
+ldap_pool = LDAPConnectionPool()
+
+class ProgressPublisher:
+    """Scanner progress callback that keeps the latest progress in memory and
+    persists it at most every PROGRESS_UPDATE_INTERVAL seconds or every 1% of
+    hosts, plus the final host; flush() writes anything still pending"""
+
+    def __init__(self, scan_id: str):
+        self.scan_id = scan_id
+        self.pending = None
+        self.last_emit_ts = 0.0
+        self.last_emit = 0
+
+    def __call__(self, current_host, processed, total):
+        self.pending = {
+            "total_hosts": total,
+            "processed_hosts": processed,
+            "current_host": current_host
+        }
+        now = time.monotonic()
+        if (processed < total
+                and now - self.last_emit_ts < PROGRESS_UPDATE_INTERVAL
+                and processed - self.last_emit < max(1, total // 100)):
+            return
+        self.last_emit_ts = now
+        self.last_emit = processed
+        self.flush()
+
+    def flush(self) -> None:
+        pending, self.pending = self.pending, None
+        if pending is not None:
+            update_scan_progress(self.scan_id, pending)
 
 @app.route('/api/scan/<scan_id>', methods=['GET'])
 def get_scan_status(scan_id):
-    cleanup_old_scans()
-    scans = load_scans()
-    
-    if scan_id not in scans:
+    scan_data = get_scan(scan_id)
+
+    if scan_data is None:
         return jsonify({
             "status": "not_found",
             "error": "Scan not found or expired"
         }), 404
-    
-    # Update timestamp
-    scans[scan_id]['timestamp'] = datetime.now()
-    save_scans(scans)
-    
-    # Remove timestamp from response
-    response_data = scans[scan_id].copy()
-    response_data.pop('timestamp', None)
-    return jsonify(response_data)
+
+    progress = scan_data.get('progress') or {}
+    # Polled by every open dashboard; encode with orjson rather than jsonify
+    response = Response(orjson.dumps(scan_data), mimetype='application/json')
+    response.set_etag(f"{scan_data.get('status')}-{progress.get('processed_hosts', 0)}-{progress.get('total_hosts', 0)}")
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 def extract_scan_config(data: dict) -> dict:
     """Helper function to extract scan configuration from request data"""
@@ -137,154 +205,165 @@ def extract_scan_config(data: dict) -> dict:
         'max_computers': data.get('max_computers', 800000),
     }
 
+def _new_scan_id(now: Optional[datetime] = None) -> str:
+    """Sortable scan id that stays unique when scans start in the same second"""
+    return f"{(now or datetime.now()).strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+def _register_scan(scan_id: str, started_at: datetime) -> None:
+    """Create the initial status entry for a new scan"""
+    save_scan(scan_id, {
+        "status": "running",
+        "started_at": started_at,
+        "progress": {
+            "total_hosts": 0,
+            "processed_hosts": 0,
+            "current_host": None
+        }
+    })
+
+def _execute_scan(scan_config: dict, scan_id: str, notify: bool = False) -> None:
+    """Run a full scan for scan_config, publishing progress under scan_id.
+
+    Shared by API-triggered and scheduled scans. When notify is set, SSE
+    subscribers receive a scan_complete/scan_error event at the end."""
+    ldap_helper = None
+    progress = None
+    try:
+        # Add debug logging for configuration
+        logger.info("Scan configuration:")
+        logger.info(f"  Threads: {scan_config['threads']}")
+        logger.info(f"  Max Depth: {scan_config['max_depth']}")
+        logger.info(f"  Batch Size: {scan_config['batch_size']}")
+        logger.info(f"  Scan Timeout: {scan_config['scan_timeout']}")
+        logger.info(f"  Host Timeout: {scan_config['host_timeout']}")
+        logger.info(f"  Max Computers: {scan_config['max_computers']}")
+
+        config = Config(
+            LDAP_SERVER=scan_config['dc'],
+            LDAP_DOMAIN=scan_config['domain'],
+            LDAP_PORT=scan_config['ldap_port'],
+            DEFAULT_THREADS=scan_config['threads'],
+            BATCH_SIZE=scan_config['batch_size'],
+            MAX_SCAN_DEPTH=scan_config['max_depth'],
+            SCAN_TIMEOUT=scan_config['scan_timeout'],
+            HOST_SCAN_TIMEOUT=scan_config['host_timeout'],
+            MAX_COMPUTERS=scan_config['max_computers']
+        )
+        config.set_credentials(scan_config['username'], scan_config['password'])
+
+        # Reuse pooled helpers
+        db_helper = get_shared_db_helper(config)
+
+        # LDAPHelper retries transient connect failures with backoff
+        ldap_helper = ldap_pool.get(config)
+
+        computers = ldap_helper.get_computers(
+            ldap_filter=scan_config['filter'],
+            ou=scan_config['ou']
+        )
+
+        if not computers:
+            raise ValueError("No computers found")
+
+        # Start scan session
+        session_id = db_helper.start_scan_session(scan_config['domain'])
+        scanner = ShareScanner(config, db_helper, session_id)
+
+        # Set progress callback and run scan
+        progress = ProgressPublisher(scan_id)
+        scanner.set_progress_callback(progress)
+        scanner.scan_network(computers)
+
+        # Update final status
+        update_scan_status(scan_id, {
+            "status": "completed",
+            "progress": {
+                "total_hosts": len(computers),
+                "processed_hosts": len(computers),
+                "current_host": None
+            }
+        })
+
+        # End scan session
+        db_helper.end_scan_session(
+            session_id,
+            total_hosts=len(computers)
+        )
+
+        logger.info(f"Scan completed successfully: {scan_id}")
+
+        if notify:
+            notify_subscribers({
+                'type': 'scan_complete',
+                'scan_id': scan_id,
+                'domain': scan_config['domain'],
+                'timestamp': datetime.now(),  # orjson emits ISO 8601
+                'stats': {
+                    'total_hosts': len(computers),
+                    'total_shares': scanner.total_shares_processed,
+                    'total_sensitive': scanner.total_sensitive_files
+                }
+            })
+
+    except Exception as e:
+        logger.error(f"Scan failed: {str(e)}")
+        logger.error(traceback.format_exc())
+        update_scan_status(scan_id, {
+            "status": "failed",
+            "error": str(e)
+        })
+        if notify:
+            notify_subscribers({
+                'type': 'scan_error',
+                'scan_id': scan_id,
+                'domain': scan_config['domain'],
+                'timestamp': datetime.now(),  # orjson emits ISO 8601
+                'error': str(e)
+            })
+        raise
+    finally:
+        if progress:
+            # Keep the last host count a failed scan reached
+            try:
+                progress.flush()
+            except Exception:
+                logger.exception(f"Failed to flush progress for scan {scan_id}")
+        if ldap_helper:
+            try:
+                ldap_pool.release(ldap_helper)
+            except Exception:
+                logger.exception(f"Failed to release LDAP connection for scan {scan_id}")
+
 @app.route('/api/scan', methods=['POST'])
 def start_scan():
     try:
         data = request.json
-        scan_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # One clock read for both the id and the recorded start time
+        now = datetime.now()
+        scan_id = _new_scan_id(now)
         
         # Extract scan configuration using helper function
         scan_config = extract_scan_config(data)
-        
-        # Initialize scan status
-        scans = load_scans()
-        scans[scan_id] = {
-            "status": "running",
-            "timestamp": datetime.now(),
-            "progress": {
-                "total_hosts": 0,
-                "processed_hosts": 0,
-                "current_host": None
-            }
-        }
-        save_scans(scans)
-        
-        def run_scan_with_status():
-            try:
-                # Add debug logging for configuration
-                logger.info("Scan configuration:")
-                logger.info(f"  Threads: {scan_config['threads']}")
-                logger.info(f"  Max Depth: {scan_config['max_depth']}")
-                logger.info(f"  Batch Size: {scan_config['batch_size']}")
-                logger.info(f"  Scan Timeout: {scan_config['scan_timeout']}")
-                logger.info(f"  Host Timeout: {scan_config['host_timeout']}")
-                logger.info(f"  Max Computers: {scan_config['max_computers']}")
-
-                config = Config(
-                    LDAP_SERVER=scan_config['dc'],
-                    LDAP_DOMAIN=scan_config['domain'],
-                    LDAP_PORT=scan_config['ldap_port'],
-                    DEFAULT_THREADS=scan_config['threads'],
-                    BATCH_SIZE=scan_config['batch_size'],
-                    MAX_SCAN_DEPTH=scan_config['max_depth'],
-                    SCAN_TIMEOUT=scan_config['scan_timeout'],
-                    HOST_SCAN_TIMEOUT=scan_config['host_timeout'],
-                    MAX_COMPUTERS=scan_config['max_computers']
-                )
-                
-                # Verify config after initialization
-                logger.info("Configured values:")
-                logger.info(f"  Threads: {config.DEFAULT_THREADS}")
-                logger.info(f"  Max Depth: {config.MAX_SCAN_DEPTH}")
-                logger.info(f"  Batch Size: {config.BATCH_SIZE}")
-                logger.info(f"  Scan Timeout: {config.SCAN_TIMEOUT}")
-                logger.info(f"  Host Timeout: {config.HOST_SCAN_TIMEOUT}")
-                logger.info(f"  Max Computers: {config.MAX_COMPUTERS}")
-
-                config.set_credentials(scan_config['username'], scan_config['password'])
-
-                # Initialize helpers with proper error handling
-                try:
-                    ldap_helper = LDAPHelper(config)
-                    db_helper = DatabaseHelper(config)
-                    db_helper.connect()
-                    db_helper.init_tables()
-
-                    # Add retry logic for LDAP connection
-                    max_retries = 3
-                    retry_delay = 2
-                    last_error = None
-
-                    for attempt in range(max_retries):
-                        try:
-                            ldap_helper.connect_with_stored_credentials()
-                            break
-                        except Exception as e:
-                            last_error = e
-                            if attempt < max_retries - 1:
-                                logger.warning(f"Attempt {attempt + 1} failed, retrying in {retry_delay} seconds...")
-                                time.sleep(retry_delay)
-                            else:
-                                raise Exception(f"Authentication failed after {max_retries} attempts: {str(e)}")
-
-                    # Add debug information
-                    logger.info(f"Debug information:")
-                    logger.info(f"Server IP: {scan_config['dc']}")
-                    logger.info(f"Domain: {scan_config['domain']}")
-                    logger.info(f"Attempted user: {scan_config['username']}")
-
-                    computers = ldap_helper.get_computers(
-                        ldap_filter=scan_config['filter'],
-                        ou=scan_config['ou']
-                    )
-
-                    if not computers:
-                        raise ValueError("No computers found")
-
-                    session_id = db_helper.start_scan_session(scan_config['domain'])
-                    scanner = ShareScanner(config, db_helper, session_id)
-
-                    def progress_callback(current_host, processed, total):
-                        update_scan_status(scan_id, {
-                            "progress": {
-                                "total_hosts": total,
-                                "processed_hosts": processed,
-                                "current_host": current_host
-                            }
-                        })
-
-                    scanner.set_progress_callback(progress_callback)
-                    scanner.scan_network(computers)
-
-                    update_scan_status(scan_id, {
-                        "status": "completed",
-                        "progress": {
-                            "total_hosts": len(computers),
-                            "processed_hosts": len(computers),
-                            "current_host": None
-                        }
-                    })
-
-                    db_helper.end_scan_session(
-                        session_id,
-                        total_hosts=len(computers),
-                        total_shares=scanner.total_shares_processed,
-                        total_sensitive=scanner.total_sensitive_files
-                    )
 
-                except Exception as e:
-                    logger.error(f"Scan error: {str(e)}")
-                    logger.error(traceback.format_exc())
-                    update_scan_status(scan_id, {
-                        "status": "failed",
-                        "error": str(e)
-                    })
-                finally:
-                    try:
-                        db_helper.close()
-                    except:
-                        pass
-
-            except Exception as e:
-                logger.error(f"Outer scan error: {str(e)}")
-                logger.error(traceback.format_exc())
-                update_scan_status(scan_id, {
-                    "status": "failed",
-                    "error": str(e)
-                })
-
-        thread = threading.Thread(target=run_scan_with_status)
-        thread.start()
+        if not _SCAN_SLOTS.acquire(blocking=False):
+            return jsonify({
+                "status": "error",
+                "error": "Too many scans running or queued"
+            }), 429, {"Retry-After": "30"}
+
+        try:
+            _register_scan(scan_id, now)
+            future = SCAN_EXECUTOR.submit(_execute_scan, scan_config, scan_id)
+        except Exception:
+            _SCAN_SLOTS.release()
+            raise
+
+        def _on_done(_):
+            _SCAN_FUTURES.pop(scan_id, None)
+            _SCAN_SLOTS.release()
+
+        _SCAN_FUTURES[scan_id] = future
+        future.add_done_callback(_on_done)
 
         return jsonify({
             "status": "started",
@@ -299,18 +378,92 @@ def start_scan():
             "error": str(e)
         }), 500
 
-@app.route('/api/schedules', methods=['GET'])
-def get_schedules():
-    try:
-        jobs = scheduler.get_jobs()
-        return jsonify([{
+@app.route('/api/scan/<scan_id>', methods=['DELETE'])
+def cancel_scan(scan_id):
+    future = _SCAN_FUTURES.get(scan_id)
+    if future is None:
+        return jsonify({
+            "status": "not_found",
+            "error": "Scan not found or not queued"
+        }), 404
+
+    if not future.cancel():
+        return jsonify({
+            "status": "error",
+            "error": "Scan is already running"
+        }), 409
+
+    update_scan_status(scan_id, {"status": "cancelled"})
+    return jsonify({"status": "cancelled", "scan_id": scan_id})
+
+# Encoded /api/schedules body; rebuilt only after the persistent job store changes
+_SCHEDULES_CACHE = None
+_SCHEDULES_CACHED_AT = 0.0
+_SCHEDULES_GENERATION = 0
+# Upper bound on staleness for changes made outside this process's scheduler
+SCHEDULES_CACHE_TTL = 30  # seconds
+
+def _invalidate_schedules_cache(event):
+    """Scheduler listener that drops the cached schedule list on any job change"""
+    global _SCHEDULES_CACHE, _SCHEDULES_GENERATION
+    _SCHEDULES_GENERATION += 1
+    _SCHEDULES_CACHE = None
+
+# Submission advances next_run_time, so it invalidates as well
+if scheduler is not None:
+    scheduler.add_listener(
+        _invalidate_schedules_cache,
+        EVENT_JOB_ADDED | EVENT_JOB_REMOVED | EVENT_JOB_MODIFIED | EVENT_JOB_SUBMITTED
+        | EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED | EVENT_ALL_JOBS_REMOVED
+    )
+
+def _scheduler_unavailable():
+    """503 response while the scheduler is still waiting for its job store, or
+    could not be created at all"""
+    return jsonify({
+        'status': 'error',
+        'error': 'Scheduler is not available yet'
+    }), 503, {"Retry-After": "10"}
+
+def _public_job_kwargs(kwargs: dict) -> dict:
+    """Job kwargs safe to return to clients; hides passwords left in older jobs"""
+    scan_config = kwargs.get('scan_config')
+    if scan_config and 'password' in scan_config:
+        kwargs = {**kwargs, 'scan_config': {k: v for k, v in scan_config.items() if k != 'password'}}
+    return kwargs
+
+def _encode_schedules(jobs):
+    """Yield the /api/schedules JSON array one job at a time"""
+    yield b'['
+    for i, job in enumerate(jobs):
+        if i:
+            yield b','
+        yield orjson.dumps({
             'id': job.id,
             'name': job.name,
             'trigger': str(job.trigger),
             'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
             'args': job.args,
-            'kwargs': job.kwargs
-        } for job in jobs])
+            'kwargs': _public_job_kwargs(job.kwargs)
+        })
+    yield b']'
+
+@app.route('/api/schedules', methods=['GET'])
+def get_schedules():
+    global _SCHEDULES_CACHE, _SCHEDULES_CACHED_AT
+    if scheduler is None or not scheduler.running:
+        return _scheduler_unavailable()
+    try:
+        body = _SCHEDULES_CACHE
+        now = time.monotonic()
+        if body is None or now - _SCHEDULES_CACHED_AT > SCHEDULES_CACHE_TTL:
+            generation = _SCHEDULES_GENERATION
+            body = b''.join(_encode_schedules(scheduler.get_jobs(jobstore='default')))
+            # Skip caching if a job changed while we were reading
+            if generation == _SCHEDULES_GENERATION:
+                _SCHEDULES_CACHE = body
+                _SCHEDULES_CACHED_AT = now
+        return Response(body, mimetype='application/json')
     except Exception as e:
         logger.error(f"Failed to get schedules: {str(e)}")
         logger.error(traceback.format_exc())
@@ -321,8 +474,13 @@ def get_schedules():
 
 @app.route('/api/schedule/<job_id>', methods=['DELETE'])
 def delete_schedule(job_id):
+    if scheduler is None or not scheduler.running:
+        return _scheduler_unavailable()
     try:
+        job = scheduler.get_job(job_id, jobstore='default')
         scheduler.remove_job(job_id)
+        if job and job.kwargs.get('cred_id'):
+            delete_credentials(job.kwargs['cred_id'])
         logger.info(f"Successfully deleted job: {job_id}")
         return jsonify({'status': 'success'})
     except Exception as e:
@@ -335,6 +493,9 @@ def delete_schedule(job_id):
 
 @app.route('/api/schedule', methods=['POST'])
 def create_schedule():
+    # A stopped scheduler would only queue the job in memory, never persist it
+    if scheduler is None or not scheduler.running:
+        return _scheduler_unavailable()
     try:
         data = request.json
         
@@ -345,21 +506,35 @@ def create_schedule():
         
         if trigger_type != 'cron':
             raise ValueError("Only cron trigger type is supported")
+
+        # Parse the trigger once here so bad values are rejected before a job exists
+        if schedule_config.get('crontab'):
+            trigger = CronTrigger.from_crontab(schedule_config['crontab'])
+        else:
+            trigger = CronTrigger(
+                day_of_week=schedule_config.get('day_of_week', '*'),
+                hour=schedule_config.get('hour', 0),
+                minute=schedule_config.get('minute', 0)
+            )
         
         # Extract scan configuration using helper function
         scan_config = extract_scan_config(data)
+        # Keep the password out of the job store; the job only references it
+        cred_id = store_credentials(scan_config.pop('username'), scan_config.pop('password'))
         
         # Create the job
-        job = scheduler.add_job(
-            run_scan_with_status,
-            'cron',
-            day_of_week=schedule_config.get('day_of_week', '*'),
-            hour=schedule_config.get('hour', 0),
-            minute=schedule_config.get('minute', 0),
-            id=f"scan_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-            name=name,
-            kwargs={'scan_config': scan_config}
-        )
+        try:
+            job = scheduler.add_job(
+                run_scan_with_status,
+                trigger,
+                executor='scans',
+                id=f"scan_{_new_scan_id()}",
+                name=name,
+                kwargs={'scan_config': scan_config, 'cred_id': cred_id}
+            )
+        except Exception:
+            delete_credentials(cred_id)
+            raise
         
         logger.info(f"Successfully created scheduled job: {job.id}")
         
@@ -369,6 +544,12 @@ def create_schedule():
             'next_run': job.next_run_time.isoformat() if job.next_run_time else None
         })
         
+    except ValueError as e:
+        logger.warning(f"Rejected schedule: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'error': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Failed to create schedule: {str(e)}")
         logger.error(traceback.format_exc())
@@ -378,180 +559,127 @@ def create_schedule():
         }), 500
 
 # Add the run_scan_with_status function that will be called by the scheduler
-def run_scan_with_status(scan_config: dict):
+def run_scan_with_status(scan_config: dict, cred_id: Optional[str] = None):
     """Function that will be called by the scheduler to run the scan"""
-    try:
-        logger.info(f"Starting scheduled scan with config: {scan_config}")
-        scan_id = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        # Initialize scan status
-        scans = load_scans()
-        scans[scan_id] = {
-            "status": "running",
-            "timestamp": datetime.now(),
-            "progress": {
-                "total_hosts": 0,
-                "processed_hosts": 0,
-                "current_host": None
-            }
-        }
-        save_scans(scans)
-        
-        # Initialize configuration
-        config = Config(
-            LDAP_SERVER=scan_config['dc'],
-            LDAP_DOMAIN=scan_config['domain'],
-            LDAP_PORT=scan_config['ldap_port'],
-            DEFAULT_THREADS=scan_config['threads'],
-            BATCH_SIZE=scan_config['batch_size'],
-            MAX_SCAN_DEPTH=scan_config['max_depth'],
-            SCAN_TIMEOUT=scan_config['scan_timeout'],
-            HOST_SCAN_TIMEOUT=scan_config['host_timeout'],
-            MAX_COMPUTERS=scan_config['max_computers']
-        )
-        config.set_credentials(scan_config['username'], scan_config['password'])
-
-        # Initialize helpers
-        ldap_helper = LDAPHelper(config)
-        db_helper = DatabaseHelper(config)
-        db_helper.connect()
-        db_helper.init_tables()
-
-        # Connect to LDAP
-        ldap_helper.connect_with_stored_credentials()
-        computers = ldap_helper.get_computers(
-            ldap_filter=scan_config['filter'],
-            ou=scan_config['ou']
-        )
-
-        if not computers:
-            raise ValueError("No computers found")
-
-        # Start scan session
-        session_id = db_helper.start_scan_session(scan_config['domain'])
-        scanner = ShareScanner(config, db_helper, session_id)
-
-        def progress_callback(current_host, processed, total):
-            update_scan_status(scan_id, {
-                "progress": {
-                    "total_hosts": total,
-                    "processed_hosts": processed,
-                    "current_host": current_host
-                }
-            })
-
-        # Set progress callback and run scan
-        scanner.set_progress_callback(progress_callback)
-        scanner.scan_network(computers)
-
-        # Update final status
-        update_scan_status(scan_id, {
-            "status": "completed",
-            "progress": {
-                "total_hosts": len(computers),
-                "processed_hosts": len(computers),
-                "current_host": None
-            }
-        })
-
-        # End scan session
-        db_helper.end_scan_session(
-            session_id,
-            total_hosts=len(computers),
-            total_shares=scanner.total_shares_processed,
-            total_sensitive=scanner.total_sensitive_files
-        )
-
-        logger.info(f"Scheduled scan completed successfully: {scan_id}")
-
-        # After scan completes successfully
-        notify_subscribers({
-            'type': 'scan_complete',
-            'scan_id': scan_id,
-            'domain': scan_config['domain'],
-            'timestamp': datetime.now().isoformat(),
-            'stats': {
-                'total_hosts': len(computers),
-                'total_shares': scanner.total_shares_processed,
-                'total_sensitive': scanner.total_sensitive_files
-            }
-        })
-
-    except Exception as e:
-        logger.error(f"Scheduled scan failed: {str(e)}")
-        logger.error(traceback.format_exc())
-        if scan_id:
-            update_scan_status(scan_id, {
-                "status": "failed",
-                "error": str(e)
-            })
-        notify_subscribers({
-            'type': 'scan_error',
-            'scan_id': scan_id,
-            'domain': scan_config['domain'],
-            'timestamp': datetime.now().isoformat(),
-            'error': str(e)
-        })
-        raise
-    finally:
+    logger.info(f"Starting scheduled scan for domain: {scan_config['domain']}")
+    if cred_id:
+        credentials = get_credentials(cred_id)
+        if credentials is None:
+            logger.error(f"No stored credentials for scheduled scan of {scan_config['domain']}")
+            return
+        scan_config = {**scan_config, **credentials}
+    now = datetime.now()
+    scan_id = _new_scan_id(now)
+    _register_scan(scan_id, now)
+    _execute_scan(scan_config, scan_id, notify=True)
+
+def _broadcast(payload: bytes) -> None:
+    """Push an encoded SSE frame to every subscriber"""
+    for subscriber in list(SUBSCRIBERS):
         try:
-            db_helper.close()
-        except:
-            pass
+            subscriber.put(payload)
+        except Exception as e:
+            logger.error(f"Failed to notify subscriber: {str(e)}")
+            logger.error("Error details:", exc_info=True)
+            SUBSCRIBERS.discard(subscriber)
 
 def notify_subscribers(event_data):
     """Notify all subscribers of an event"""
     logger.info(f"Notifying subscribers of event: {event_data}")
     logger.info(f"Current subscribers before notification: {len(SUBSCRIBERS)}")
-    
-    dead_subscribers = set()
-    
-    for subscriber in SUBSCRIBERS.copy():  # Use copy to avoid modification during iteration
+
+    # Build the SSE frame once for all subscribers
+    _broadcast(b"data: " + orjson.dumps(event_data) + b"\n\n")
+
+    logger.info(f"Subscribers after notification: {len(SUBSCRIBERS)}")
+
+def send_heartbeat():
+    """Send one heartbeat to every subscriber so idle streams stay open"""
+    _broadcast(_HEARTBEAT)
+
+# One scheduled heartbeat for all SSE connections instead of a timeout per connection
+maintenance_scheduler.add_job(
+    send_heartbeat,
+    'interval',
+    seconds=SSE_HEARTBEAT_INTERVAL,
+    id='sse_heartbeat',
+    replace_existing=True
+)
+
+# Expire old scan rows off the request path
+maintenance_scheduler.add_job(
+    cleanup_old_scans,
+    'interval',
+    seconds=SCAN_CLEANUP_INTERVAL,
+    id='scan_cleanup',
+    replace_existing=True,
+    next_run_time=datetime.now()
+)
+
+_services_lock = threading.Lock()
+_services_started = False
+_scheduler_starter = None
+
+def _start_scan_scheduler() -> None:
+    """Start the persistent scheduler, retrying with backoff until its job store connects"""
+    global _services_started
+    delay = SCHEDULER_START_BASE_DELAY
+    while True:
         try:
-            subscriber.put(event_data)
-            logger.info("Successfully sent event to subscriber")
+            scheduler.start()
+            break
         except Exception as e:
-            logger.error(f"Failed to notify subscriber: {str(e)}")
-            logger.error("Error details:", exc_info=True)
-            dead_subscribers.add(subscriber)
-    
-    # Remove dead subscribers
-    for dead in dead_subscribers:
-        SUBSCRIBERS.discard(dead)
-    
-    logger.info(f"Subscribers after notification: {len(SUBSCRIBERS)}")
+            logger.warning(f"Failed to start scheduler, retrying in {delay} seconds: {str(e)}")
+            time.sleep(delay)
+            delay = min(SCHEDULER_START_MAX_DELAY, delay * 2)
+    logger.info("Scheduler started successfully")
+    with _services_lock:
+        _services_started = True
+
+def start_background_services() -> None:
+    """Start the schedulers once per process.
+
+    Gunicorn calls this from post_fork so the threads live in the worker
+    rather than the preloaded master, where they would not survive the fork.
+    The maintenance scheduler starts right away; the persistent scheduler
+    is started in the background and retried until Postgres accepts connections."""
+    global _scheduler_starter
+    with _services_lock:
+        if _services_started or (_scheduler_starter is not None and _scheduler_starter.is_alive()):
+            return
+        if not maintenance_scheduler.running:
+            maintenance_scheduler.start()
+            logger.info("Maintenance scheduler started successfully")
+        if scheduler is None:
+            return
+        _scheduler_starter = threading.Thread(
+            target=_start_scan_scheduler, name="scheduler-start", daemon=True
+        )
+        _scheduler_starter.start()
 
 @app.route('/api/events', methods=['GET'])
 def events():
     def event_stream():
-        queue = Queue()
-        SUBSCRIBERS.add(queue)
+        subscriber = Subscriber()
+        SUBSCRIBERS.add(subscriber)
         logger.info(f"New subscriber connected. Total subscribers: {len(SUBSCRIBERS)}")
         
         try:
             # Send initial connection event
-            yield f"data: {json.dumps({'type': 'connected'})}\n\n".encode('utf-8')
+            yield _CONNECTED
             
             while True:
                 try:
-                    # Shorter timeout for more frequent heartbeats
-                    event_data = queue.get(timeout=30)
-                    logger.info(f"Sending event to client: {event_data}")
-                    yield f"data: {json.dumps(event_data)}\n\n".encode('utf-8')
-                except Empty:
-                    # Queue timeout - send heartbeat
-                    logger.debug("Sending heartbeat")
-                    yield f"data: {json.dumps({'type': 'heartbeat'})}\n\n".encode('utf-8')
-                    # Force flush the response
-                    if hasattr(Response, 'flush'):
-                        Response.flush()
+                    # Heartbeats arrive through the buffer from send_heartbeat
+                    for payload in subscriber.drain(timeout=None):
+                        yield payload
                 except Exception as e:
                     logger.error(f"Error in event stream: {str(e)}")
                     logger.error("Error details:", exc_info=True)
                     break
 
         finally:
-            SUBSCRIBERS.discard(queue)
+            SUBSCRIBERS.discard(subscriber)
             logger.info(f"Subscriber disconnected. Remaining subscribers: {len(SUBSCRIBERS)}")
 
     return Response(
@@ -568,4 +696,6 @@ def events():
     )
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # No debug reloader: it would import this module twice and run two schedulers
+    start_background_services()
+    app.run(threaded=True)
\ No newline at end of file
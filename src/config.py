@@ -1,9 +1,29 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
+from functools import lru_cache
 import os
 from dotenv import load_dotenv
 
-@dataclass
+__all__ = ['Config', 'Credentials']
+
+_ENV_KEYS = (
+    "DB_HOST", "DB_PORT", "DB_NAME", "DB_USER", "DB_PASSWORD", "DB_POOL_CAP",
+    "MAX_SCAN_DEPTH", "SCAN_TIMEOUT", "HOST_SCAN_TIMEOUT", "MAX_COMPUTERS", "DEFAULT_THREADS",
+)
+
+@lru_cache(maxsize=1)
+def _env_snapshot() -> dict:
+    """Read .env and the settings Config uses once per process"""
+    load_dotenv()
+    return {key: os.environ[key] for key in _ENV_KEYS if key in os.environ}
+
+@dataclass(slots=True)
+class Credentials:
+    """Runtime LDAP credentials, kept mutable beside the frozen Config"""
+    username: Optional[str] = None
+    password: Optional[str] = field(default=None, repr=False)
+
+@dataclass(slots=True, frozen=True)
 class Config:
     LDAP_SERVER: Optional[str] = None
     LDAP_DOMAIN: Optional[str] = None
@@ -21,9 +41,10 @@ class Config:
     DB_PASSWORD: str = ""
     DB_MIN_CONNECTIONS: int = 10
     DB_MAX_CONNECTIONS: int = 100
+    DB_POOL_CAP: Optional[int] = None  # Upper bound on DB_MAX_CONNECTIONS; None: 2 * this host's CPU count
     
     # Runtime credentials
-    _credentials: dict = None
+    _credentials: Credentials = field(default_factory=Credentials, repr=False)
     
     # Scanning depth and timeout settings
     MAX_SCAN_DEPTH: int = 5
@@ -32,48 +53,55 @@ class Config:
     
     MAX_COMPUTERS: int = 800000  # Maximum number of computers to process
     
+    # LDAP connect retries (CLI and API): decorrelated-jitter backoff between base and max delay
+    LDAP_CONNECT_RETRIES: int = 3
+    LDAP_RETRY_BASE_DELAY: float = 0.05  # seconds
+    LDAP_RETRY_MAX_DELAY: float = 5.0  # seconds
+    
     def __post_init__(self):
+        # Frozen: env overrides are applied through object.__setattr__
+        set_field = lambda name, value: object.__setattr__(self, name, value)
+
         # Load environment variables
-        load_dotenv()
+        env = _env_snapshot()
         
         # Set default excluded shares if not provided
         if self.DEFAULT_EXCLUDED_SHARES is None:
-            self.DEFAULT_EXCLUDED_SHARES = ['ADMIN$', 'IPC$', 'print$']
-            
-        # Initialize empty credentials
-        self._credentials = {}
+            set_field('DEFAULT_EXCLUDED_SHARES', ['ADMIN$', 'IPC$', 'print$'])
             
         # Load database settings from environment (these should still use env vars)
-        self.DB_HOST = os.getenv("DB_HOST", self.DB_HOST)
-        self.DB_PORT = int(os.getenv("DB_PORT", self.DB_PORT))
-        self.DB_NAME = os.getenv("DB_NAME", self.DB_NAME)
-        self.DB_USER = os.getenv("DB_USER", self.DB_USER)
-        self.DB_PASSWORD = os.getenv("DB_PASSWORD", self.DB_PASSWORD)
+        set_field('DB_HOST', env.get("DB_HOST", self.DB_HOST))
+        set_field('DB_PORT', int(env.get("DB_PORT", self.DB_PORT)))
+        set_field('DB_NAME', env.get("DB_NAME", self.DB_NAME))
+        set_field('DB_USER', env.get("DB_USER", self.DB_USER))
+        set_field('DB_PASSWORD', env.get("DB_PASSWORD", self.DB_PASSWORD))
+        if "DB_POOL_CAP" in env:
+            set_field('DB_POOL_CAP', int(env["DB_POOL_CAP"]))
+        elif self.DB_POOL_CAP is None:
+            set_field('DB_POOL_CAP', 2 * (os.cpu_count() or 1))
         
         # Only set scanning settings from environment if not explicitly provided
         # This ensures runtime values take precedence
         if self.MAX_SCAN_DEPTH == 5:  # Default value
-            self.MAX_SCAN_DEPTH = int(os.getenv("MAX_SCAN_DEPTH", self.MAX_SCAN_DEPTH))
+            set_field('MAX_SCAN_DEPTH', int(env.get("MAX_SCAN_DEPTH", self.MAX_SCAN_DEPTH)))
         if self.SCAN_TIMEOUT == 30:  # Default value
-            self.SCAN_TIMEOUT = int(os.getenv("SCAN_TIMEOUT", self.SCAN_TIMEOUT))
+            set_field('SCAN_TIMEOUT', int(env.get("SCAN_TIMEOUT", self.SCAN_TIMEOUT)))
         if self.HOST_SCAN_TIMEOUT == 300:  # Default value
-            self.HOST_SCAN_TIMEOUT = int(os.getenv("HOST_SCAN_TIMEOUT", self.HOST_SCAN_TIMEOUT))
+            set_field('HOST_SCAN_TIMEOUT', int(env.get("HOST_SCAN_TIMEOUT", self.HOST_SCAN_TIMEOUT)))
         if self.MAX_COMPUTERS == 800000:  # Default value
-            self.MAX_COMPUTERS = int(os.getenv("MAX_COMPUTERS", self.MAX_COMPUTERS))
+            set_field('MAX_COMPUTERS', int(env.get("MAX_COMPUTERS", self.MAX_COMPUTERS)))
         if self.DEFAULT_THREADS == 10:  # Default value
-            self.DEFAULT_THREADS = int(os.getenv("DEFAULT_THREADS", self.DEFAULT_THREADS))
+            set_field('DEFAULT_THREADS', int(env.get("DEFAULT_THREADS", self.DEFAULT_THREADS)))
     
     @property
     def LDAP_USER(self):
-        return self._credentials.get('username')
+        return self._credentials.username
     
     @property
     def LDAP_PASSWORD(self):
-        return self._credentials.get('password')
+        return self._credentials.password
     
     def set_credentials(self, username: str, password: str):
         """Set the runtime credentials"""
-        self._credentials = {
-            'username': username,
-            'password': password
-        }
\ No newline at end of file
+        self._credentials.username = username
+        self._credentials.password = password
\ No newline at end of file
@@ -0,0 +1,64 @@
+import os
+import secrets
+import threading
+import logging
+from typing import Optional
+import orjson
+from dotenv import load_dotenv
+from cryptography.fernet import Fernet, InvalidToken
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Credentials for scheduled scans; jobs only carry the opaque cred_id
+CREDENTIALS_FILE = "credentials.enc"
+CREDENTIALS_KEY = os.getenv("CREDENTIALS_KEY")  # Fernet key; memory-only store if unset
+
+_CREDENTIAL_LOCK = threading.Lock()
+_CREDENTIAL_STORE: dict = {}
+_fernet = Fernet(CREDENTIALS_KEY) if CREDENTIALS_KEY else None
+
+def _load():
+    """Read the encrypted credential file into memory"""
+    if not _fernet:
+        logger.warning("CREDENTIALS_KEY not set; scheduled scan credentials will not survive a restart")
+        return
+    try:
+        with open(CREDENTIALS_FILE, 'rb') as f:
+            _CREDENTIAL_STORE.update(orjson.loads(_fernet.decrypt(f.read())))
+    except FileNotFoundError:
+        pass
+    except (InvalidToken, orjson.JSONDecodeError) as e:
+        logger.error(f"Failed to read {CREDENTIALS_FILE}: {type(e).__name__}")
+
+def _persist():
+    """Write the store to disk encrypted; caller holds _CREDENTIAL_LOCK"""
+    if not _fernet:
+        return
+    tmp_path = CREDENTIALS_FILE + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(_fernet.encrypt(orjson.dumps(_CREDENTIAL_STORE)))
+    os.replace(tmp_path, CREDENTIALS_FILE)
+
+def store_credentials(username: str, password: str) -> str:
+    """Save a username/password pair and return its cred_id"""
+    cred_id = secrets.token_hex(16)
+    with _CREDENTIAL_LOCK:
+        _CREDENTIAL_STORE[cred_id] = {'username': username, 'password': password}
+        _persist()
+    return cred_id
+
+def get_credentials(cred_id: str) -> Optional[dict]:
+    """Look up the credentials for cred_id, or None if unknown"""
+    with _CREDENTIAL_LOCK:
+        return _CREDENTIAL_STORE.get(cred_id)
+
+def delete_credentials(cred_id: str):
+    """Forget the credentials for cred_id"""
+    with _CREDENTIAL_LOCK:
+        if _CREDENTIAL_STORE.pop(cred_id, None) is not None:
+            _persist()
+
+_load()
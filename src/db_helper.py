@@ -1,17 +1,215 @@
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 from psycopg2.extras import execute_values
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional
 from config import Config
 from psycopg2.pool import ThreadedConnectionPool
 from models import ShareResult
 import time
+import random
+from operator import itemgetter
+from itertools import islice
+import threading
 from contextlib import contextmanager
+import io
+import struct
+from datetime import datetime, timedelta
+import weakref
+import select
+
+# Escapes for COPY ... FORMAT text fields
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+def _copy_lines(rows):
+    """Encode rows as COPY text format lines (tab separated, \\N for NULL)"""
+    return (
+        '\t'.join('\\N' if value is None else str(value).translate(_COPY_ESCAPES) for value in row) + '\n'
+        for row in rows
+    )
+
+class _CopyReader:
+    """File-like object for copy_expert that encodes rows only as they are read"""
+
+    def __init__(self, rows):
+        self._lines = _copy_lines(rows)
+        self._buf = ''
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buf) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buf += line
+        if size < 0:
+            size = len(self._buf)
+        chunk, self._buf = self._buf[:size], self._buf[size:]
+        return chunk
+
+# store_results statements, kept as bytes so psycopg2 does not re-encode them per batch.
+# Share ids are drawn from the sequence up front so the shares themselves can be
+# COPYed (COPY cannot RETURN ids) and child rows reference them directly
+_SQL_ALLOCATE_SHARE_IDS = (
+    b"SELECT nextval(pg_get_serial_sequence('shares', 'id')) FROM generate_series(1, %s)"
+)
+_SQL_COPY_SHARES = (
+    b"COPY shares (id, hostname, share_name, access_level, error_message, "
+    b"total_files, total_dirs, hidden_files, scan_time, session_id) FROM STDIN WITH (FORMAT binary)"
+)
+_SQL_INSERT_ROOT_FILES = b"""
+    INSERT INTO root_files
+    (share_id, file_name, file_type, file_size, attributes, created_time, modified_time)
+    VALUES %s
+"""
+_SQL_COPY_SENSITIVE_FILES = (
+    b"COPY sensitive_files (share_id, file_path, file_name, detection_type) FROM STDIN WITH (FORMAT text)"
+)
+
+# COPY ... FORMAT binary framing. Integers and timestamps go over the wire as fixed-width
+# binary rather than decimal text, so the server skips parsing them
+_PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+_PGCOPY_TRAILER = struct.pack('!h', -1)
+_PGCOPY_NULL = struct.pack('!i', -1)
+_PGCOPY_INT4 = struct.Struct('!ii')  # Field length, value
+_PGCOPY_INT8 = struct.Struct('!iq')
+_PG_EPOCH = datetime(2000, 1, 1)
+_SHARES_FIELDS = struct.pack('!h', 10)
+
+def _binary_int4(value) -> bytes:
+    return _PGCOPY_NULL if value is None else _PGCOPY_INT4.pack(4, value)
+
+def _binary_text(value) -> bytes:
+    if value is None:
+        return _PGCOPY_NULL
+    data = value.encode('utf-8')
+    return struct.pack('!i', len(data)) + data
+
+def _binary_timestamp(value) -> bytes:
+    """Encode a datetime or ISO string as timestamp; an offset is dropped, as the text input would"""
+    if value is None:
+        return _PGCOPY_NULL
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return _PGCOPY_INT8.pack(8, (value.replace(tzinfo=None) - _PG_EPOCH) // timedelta(microseconds=1))
+
+def _encode_share_rows(batch, session_id) -> List[bytes]:
+    """Encode each result as a COPY binary row of _SQL_COPY_SHARES, minus the
+    leading field count and id, which are only known once ids are allocated"""
+    session_field = _binary_int4(session_id)
+    return [
+        b''.join((
+            _binary_text(result.hostname[:255]),  # Truncate if too long
+            _binary_text(result.share_name[:255]),
+            _binary_text(result.access_level.value),
+            _binary_text(result.error_message),
+            _binary_int4(result.total_files),
+            _binary_int4(result.total_dirs),
+            _binary_int4(result.hidden_files),
+            _binary_timestamp(result.scan_time),
+            session_field,
+        ))
+        for result in batch
+    ]
+
+def _shares_copy(share_ids, share_rows) -> bytes:
+    """Frame encoded share rows with their ids as a COPY binary stream"""
+    parts = [_PGCOPY_HEADER]
+    for share_id, row in zip(share_ids, share_rows):
+        parts += (_SHARES_FIELDS, _binary_int4(share_id), row)
+    parts.append(_PGCOPY_TRAILER)
+    return b''.join(parts)
+
+# Fields of a scanner sensitive-file match, in sensitive_files column order
+_SENSITIVE_FIELDS = itemgetter('path', 'filename', 'type')
+
+def _sensitive_file_rows(share_ids, batch):
+    """Yield sensitive_files rows for a batch without building a list"""
+    for share_id, result in zip(share_ids, batch):
+        for sensitive_file in result.sensitive_files or ():
+            path, filename, detection_type = _SENSITIVE_FIELDS(sensitive_file)
+            yield share_id, path[:4096], filename[:255], detection_type[:50]
+
+# Hot parameterized statements; PREPAREd once per pooled connection, then run with EXECUTE
+# so the server skips parse and plan on every call
+_PATTERN_COLUMNS = "id, pattern, type, description, enabled, created_at, updated_at"
+_PREPARED_STATEMENTS = {
+    'start_scan_session': """
+        INSERT INTO scan_sessions (domain, scan_status) VALUES ($1, 'running') RETURNING id
+    """,
+    'end_scan_session': """
+        UPDATE scan_sessions s
+        SET end_time = CURRENT_TIMESTAMP,
+            total_hosts = $1,
+            total_shares = (SELECT count(*) FROM shares WHERE session_id = s.id),
+            total_sensitive_files = (
+                SELECT count(*) FROM sensitive_files sf
+                JOIN shares sh ON sh.id = sf.share_id
+                WHERE sh.session_id = s.id
+            ),
+            scan_status = 'completed'
+        WHERE id = $2
+    """,
+    'select_patterns': f"""
+        SELECT {_PATTERN_COLUMNS} FROM sensitive_patterns ORDER BY type, pattern
+    """,
+    'insert_pattern': f"""
+        INSERT INTO sensitive_patterns (pattern, type, description)
+        VALUES ($1, $2, $3)
+        RETURNING {_PATTERN_COLUMNS}
+    """,
+    'update_pattern': f"""
+        UPDATE sensitive_patterns
+        SET pattern = $1, type = $2, description = $3,
+            enabled = $4, updated_at = CURRENT_TIMESTAMP
+        WHERE id = $5
+        RETURNING {_PATTERN_COLUMNS}
+    """,
+    'delete_pattern': """
+        DELETE FROM sensitive_patterns WHERE id = $1
+    """,
+}
+_SQL_PREPARE_STATEMENTS = ';'.join(
+    f"PREPARE {name} AS {sql}" for name, sql in _PREPARED_STATEMENTS.items()
+).encode()
+
+# get_sensitive_patterns caches rows; a trigger created by init_tables notifies this
+# channel on any write to sensitive_patterns (including the Node backend's), so every
+# process listening on it drops its cache
+PATTERNS_CHANNEL = "sensitive_patterns_changed"
+
+def _copy_expert(cur, sql, file):
+    """cur.copy_expert that also works when a green wait callback is registered
+    (psycogreen under gevent), where psycopg2 refuses COPY. The callback is lifted
+    for the duration; the COPY blocks the worker, so no other greenlet runs meanwhile"""
+    wait_callback = psycopg2.extensions.get_wait_callback()
+    if wait_callback is None:
+        return cur.copy_expert(sql, file)
+    psycopg2.extensions.set_wait_callback(None)
+    try:
+        return cur.copy_expert(sql, file)
+    finally:
+        psycopg2.extensions.set_wait_callback(wait_callback)
 
 class DatabaseError(Exception):
     """Custom exception for database operations"""
     pass
 
+class PoolTimeoutError(DatabaseError):
+    """No pooled connection became free within operation_timeout"""
+    pass
+
+# Errors worth retrying: dropped connections, timeouts, lock conflicts, and a saturated pool
+_TRANSIENT_ERRORS = (
+    psycopg2.OperationalError,
+    psycopg2.InterfaceError,
+    psycopg2.errors.DeadlockDetected,
+    psycopg2.errors.SerializationFailure,
+    PoolTimeoutError,
+)
+
 class DatabaseHelper:
+    PATTERNS_CACHE_TTL = 30  # seconds; fallback when no NOTIFY arrives
+
     def __init__(self, config: Config):
         self.config = config
         self.pool = None
@@ -19,7 +217,20 @@ class DatabaseHelper:
         self.retry_delay = 2  # seconds
         self.operation_timeout = 30  # seconds
         self.batch_size = 5000  # Maximum records to process in one batch
-        
+        self._indexes_ready = False
+        self._init_lock = threading.Lock()  # Guards lazy pool creation
+        self._conn_slots = None  # Bounds checked-out connections to the pool size; set by connect()
+        self._prepared_conns = weakref.WeakSet()  # Connections that have _PREPARED_STATEMENTS
+        self._patterns_lock = threading.Lock()
+        self._patterns_cache = None  # (monotonic time loaded, rows)
+        self._patterns_listener = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
     @contextmanager
     def get_db_connection(self):
         """Context manager for database connections with timeout and retry"""
@@ -30,23 +241,41 @@ class DatabaseHelper:
         except Exception as e:
             if conn:
                 conn.rollback()
-            raise DatabaseError(f"Database operation failed: {str(e)}")
+            raise DatabaseError(f"Database operation failed: {str(e)}") from e
         finally:
             if conn:
                 self.return_connection(conn)
 
+    @contextmanager
+    def get_prepared_connection(self):
+        """get_db_connection, with _PREPARED_STATEMENTS available for EXECUTE.
+
+        They are PREPAREd on first use of each pooled connection rather than at
+        checkout, since the tables they reference may not exist before init_tables"""
+        with self.get_db_connection() as conn:
+            if conn not in self._prepared_conns:
+                with conn.cursor() as cur:
+                    cur.execute(_SQL_PREPARE_STATEMENTS)
+                conn.commit()
+                self._prepared_conns.add(conn)
+            yield conn
+
     def _retry_operation(self, operation_func, *args, **kwargs):
-        """Retry mechanism for database operations"""
+        """Retry mechanism for database operations; only transient errors are retried,
+        with exponential backoff and jitter"""
         last_exception = None
         for attempt in range(self.max_retries):
             try:
                 return operation_func(*args, **kwargs)
             except Exception as e:
+                # get_db_connection wraps driver errors; classify by the original
+                if not isinstance(e.__cause__ or e, _TRANSIENT_ERRORS):
+                    raise
                 last_exception = e
                 if attempt < self.max_retries - 1:
-                    print(f"Database operation failed, attempt {attempt + 1} of {self.max_retries}")
-                    time.sleep(self.retry_delay)
-                continue
+                    delay = self.retry_delay * (2 ** attempt) + random.uniform(0, 0.5)
+                    print(f"Database operation failed, attempt {attempt + 1} of {self.max_retries}, retrying in {delay:.1f}s")
+                    time.sleep(delay)
         raise DatabaseError(f"Operation failed after {self.max_retries} attempts: {str(last_exception)}")
 
     def init_tables(self):
@@ -54,11 +283,9 @@ class DatabaseHelper:
         def _init():
             with self.get_db_connection() as conn:
                 with conn.cursor() as cur:
-                    # Set statement timeout
-                    cur.execute(f"SET statement_timeout = {self.operation_timeout * 1000}")
-                    
-                    # Create shares table
+                    # All DDL goes in one round trip
                     cur.execute("""
+                        -- Create shares table
                         CREATE TABLE IF NOT EXISTS shares (
                             id SERIAL PRIMARY KEY,
                             hostname VARCHAR(255) NOT NULL,
@@ -70,20 +297,16 @@ class DatabaseHelper:
                             hidden_files INTEGER DEFAULT 0,
                             scan_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                             UNIQUE(hostname, share_name, scan_time)
-                        )
-                    """)
+                        );
 
-                    # Create share_permissions table
-                    cur.execute("""
+                        -- Create share_permissions table
                         CREATE TABLE IF NOT EXISTS share_permissions (
                             id SERIAL PRIMARY KEY,
                             share_id INTEGER REFERENCES shares(id) ON DELETE CASCADE,
                             permission VARCHAR(50)
-                        )
-                    """)
+                        );
 
-                    # Create root_files table
-                    cur.execute("""
+                        -- Create root_files table
                         CREATE TABLE IF NOT EXISTS root_files (
                             id SERIAL PRIMARY KEY,
                             share_id INTEGER REFERENCES shares(id) ON DELETE CASCADE,
@@ -93,11 +316,9 @@ class DatabaseHelper:
                             attributes TEXT[],
                             created_time TIMESTAMP,
                             modified_time TIMESTAMP
-                        )
-                    """)
+                        );
 
-                    # Create sensitive_files table
-                    cur.execute("""
+                        -- Create sensitive_files table
                         CREATE TABLE IF NOT EXISTS sensitive_files (
                             id SERIAL PRIMARY KEY,
                             share_id INTEGER REFERENCES shares(id) ON DELETE CASCADE,
@@ -106,11 +327,9 @@ class DatabaseHelper:
                             detection_type VARCHAR(50),
                             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                             CONSTRAINT path_length_check CHECK (length(file_path) <= 4096)
-                        )
-                    """)
+                        );
 
-                    # Create sensitive_patterns table
-                    cur.execute("""
+                        -- Create sensitive_patterns table
                         CREATE TABLE IF NOT EXISTS sensitive_patterns (
                             id SERIAL PRIMARY KEY,
                             pattern VARCHAR(255) NOT NULL,
@@ -119,52 +338,13 @@ class DatabaseHelper:
                             enabled BOOLEAN DEFAULT true,
                             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    """)
+                        );
 
-                    # Add index for pattern lookups
-                    cur.execute("""
+                        -- Add index for pattern lookups
                         CREATE INDEX IF NOT EXISTS idx_sensitive_patterns_type 
-                        ON sensitive_patterns(type)
-                    """)
-
-                    # Add default patterns if table is empty
-                    cur.execute("SELECT COUNT(*) FROM sensitive_patterns")
-                    if cur.fetchone()[0] == 0:
-                        default_patterns = [
-                            ('pass(word|wd)?|secret|credential|key|auth|token|apikey|api.?key', 'credential', 'Credential-related file'),
-                            ('ssn|social.*security|tax|ein|itin|passport', 'pii', 'Government ID related'),
-                            ('bank|account|routing|swift|iban|credit.*card|debit.*card', 'financial', 'Financial information'),
-                            ('salary|payroll|compensation|benefits', 'hr', 'HR/Personnel information'),
-                            ('medical|health|diagnosis|patient|rx|prescription', 'health', 'Healthcare information'),
-                            ('driver.*license|birth.*certificate|national.*id', 'identity', 'Identity documents'),
-                            ('confidential|private|sensitive|restricted|internal', 'classification', 'Explicitly marked sensitive'),
-                            ('contract|agreement|nda|legal', 'legal', 'Legal documents'),
-                            ('backup|dump|export|archive', 'backup', 'Backup/Export files'),
-                            ('config|settings|env|properties', 'configuration', 'Configuration files'),
-                            # ... add other default patterns ...
-                        ]
-                        execute_values(cur, """
-                            INSERT INTO sensitive_patterns (pattern, type, description)
-                            VALUES %s
-                        """, default_patterns)
-
-                    # Create indexes
-                    indexes = [
-                        "CREATE INDEX IF NOT EXISTS idx_shares_hostname ON shares(hostname)",
-                        "CREATE INDEX IF NOT EXISTS idx_shares_scan_time ON shares(scan_time)",
-                        "CREATE INDEX IF NOT EXISTS idx_sensitive_files_share_id ON sensitive_files(share_id)",
-                        "CREATE INDEX IF NOT EXISTS idx_sensitive_files_detection_type ON sensitive_files(detection_type)"
-                    ]
-
-                    for index_sql in indexes:
-                        try:
-                            cur.execute(index_sql)
-                        except Exception as e:
-                            print(f"Warning: Index creation failed: {str(e)}")
+                        ON sensitive_patterns(type);
 
-                    # Create scan_sessions table
-                    cur.execute("""
+                        -- Create scan_sessions table
                         CREATE TABLE IF NOT EXISTS scan_sessions (
                             id SERIAL PRIMARY KEY,
                             domain VARCHAR(255) NOT NULL,
@@ -174,164 +354,271 @@ class DatabaseHelper:
                             total_shares INTEGER DEFAULT 0,
                             total_sensitive_files INTEGER DEFAULT 0,
                             scan_status VARCHAR(50) DEFAULT 'running'
-                        )
-                    """)
+                        );
 
-                    # Modify shares table to include session_id
-                    cur.execute("""
+                        -- Modify shares table to include session_id
                         ALTER TABLE shares 
-                        ADD COLUMN IF NOT EXISTS session_id INTEGER REFERENCES scan_sessions(id) ON DELETE CASCADE
+                        ADD COLUMN IF NOT EXISTS session_id INTEGER REFERENCES scan_sessions(id) ON DELETE CASCADE;
+
+                        -- Counts are never negative; enforced by the server so the COPY path needs
+                        -- no per-row clamping. NOT VALID skips re-checking rows stored before it existed
+                        DO $$
+                        BEGIN
+                            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'shares_counts_nonneg') THEN
+                                ALTER TABLE shares ADD CONSTRAINT shares_counts_nonneg
+                                CHECK (total_files >= 0 AND total_dirs >= 0 AND hidden_files >= 0) NOT VALID;
+                            END IF;
+                        END $$;
+
+                        -- Notify PATTERNS_CHANNEL once per statement that changes patterns, whichever
+                        -- client made it, so pattern caches are invalidated for every writer
+                        CREATE OR REPLACE FUNCTION notify_sensitive_patterns_changed() RETURNS trigger AS $$
+                        BEGIN
+                            PERFORM pg_notify('sensitive_patterns_changed', '');
+                            RETURN NULL;
+                        END $$ LANGUAGE plpgsql;
+
+                        DO $$
+                        BEGIN
+                            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'sensitive_patterns_notify'
+                                           AND tgrelid = 'sensitive_patterns'::regclass) THEN
+                                CREATE TRIGGER sensitive_patterns_notify
+                                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON sensitive_patterns
+                                FOR EACH STATEMENT EXECUTE FUNCTION notify_sensitive_patterns_changed();
+                            END IF;
+                        END $$
                     """)
 
-                    # Add indexes
-                    cur.execute("""
-                        CREATE INDEX IF NOT EXISTS idx_shares_session_id ON shares(session_id);
-                        CREATE INDEX IF NOT EXISTS idx_scan_sessions_domain ON scan_sessions(domain);
-                        CREATE INDEX IF NOT EXISTS idx_scan_sessions_start_time ON scan_sessions(start_time);
-                    """)
+                    # Add default patterns if table is empty; the check runs server-side in
+                    # the same statement, so there is no SELECT COUNT(*) round trip. Deleted
+                    # defaults are not brought back while any pattern remains
+                    default_patterns = [
+                        ('pass(word|wd)?|secret|credential|key|auth|token|apikey|api.?key', 'credential', 'Credential-related file'),
+                        ('ssn|social.*security|tax|ein|itin|passport', 'pii', 'Government ID related'),
+                        ('bank|account|routing|swift|iban|credit.*card|debit.*card', 'financial', 'Financial information'),
+                        ('salary|payroll|compensation|benefits', 'hr', 'HR/Personnel information'),
+                        ('medical|health|diagnosis|patient|rx|prescription', 'health', 'Healthcare information'),
+                        ('driver.*license|birth.*certificate|national.*id', 'identity', 'Identity documents'),
+                        ('confidential|private|sensitive|restricted|internal', 'classification', 'Explicitly marked sensitive'),
+                        ('contract|agreement|nda|legal', 'legal', 'Legal documents'),
+                        ('backup|dump|export|archive', 'backup', 'Backup/Export files'),
+                        ('config|settings|env|properties', 'configuration', 'Configuration files'),
+                        # ... add other default patterns ...
+                    ]
+                    execute_values(cur, """
+                        INSERT INTO sensitive_patterns (pattern, type, description)
+                        SELECT * FROM (VALUES %s) AS defaults (pattern, type, description)
+                        WHERE NOT EXISTS (SELECT 1 FROM sensitive_patterns)
+                    """, default_patterns, page_size=len(default_patterns))
 
                     conn.commit()
 
         return self._retry_operation(_init)
 
+    # Secondary indexes; built after results are loaded rather than maintained during the first load
+    SECONDARY_INDEXES = [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_shares_hostname ON shares(hostname)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_shares_scan_time ON shares(scan_time)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_shares_session_id ON shares(session_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sensitive_files_share_id ON sensitive_files(share_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sensitive_files_detection_type ON sensitive_files(detection_type)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_scan_sessions_domain ON scan_sessions(domain)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_scan_sessions_start_time ON scan_sessions(start_time)",
+    ]
+
+    def ensure_indexes(self):
+        """Create missing secondary indexes without blocking writers; runs once per helper"""
+        if self._indexes_ready:
+            return
+        with self.get_db_connection() as conn:
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    # Index builds on a loaded database can outlast the connection's statement timeout
+                    cur.execute("SET statement_timeout = 0")
+                    try:
+                        for index_sql in self.SECONDARY_INDEXES:
+                            try:
+                                cur.execute(index_sql)
+                            except Exception as e:
+                                print(f"Warning: Index creation failed: {str(e)}")
+                    finally:
+                        cur.execute("RESET statement_timeout")
+            finally:
+                conn.autocommit = False
+        self._indexes_ready = True
+
     def connect(self):
         """Initialize the connection pool with retry mechanism"""
+        # DB_POOL_CAP defaults to twice the CPU count of this (scanner/API) host, not the
+        # Postgres server's, which may have more cores; set it to match the server. Callers
+        # beyond the cap wait for a connection; a wait longer than operation_timeout raises
+        # PoolTimeoutError, which _retry_operation retries
+        max_connections = min(self.config.DB_MAX_CONNECTIONS, self.config.DB_POOL_CAP)
+        if max_connections < self.config.DB_MAX_CONNECTIONS:
+            print(f"Capping database pool at {max_connections} connections "
+                  f"(DB_MAX_CONNECTIONS={self.config.DB_MAX_CONNECTIONS}, DB_POOL_CAP={self.config.DB_POOL_CAP})")
+
         def _connect():
+            self._conn_slots = threading.BoundedSemaphore(max_connections)
             self.pool = ThreadedConnectionPool(
-                self.config.DB_MIN_CONNECTIONS,
-                self.config.DB_MAX_CONNECTIONS,
-                host=self.config.DB_HOST,
-                port=self.config.DB_PORT,
-                dbname=self.config.DB_NAME,
-                user=self.config.DB_USER,
-                password=self.config.DB_PASSWORD,
-                connect_timeout=self.operation_timeout
+                min(self.config.DB_MIN_CONNECTIONS, max_connections),
+                max_connections,
+                **self._connection_kwargs()
             )
             # Test the connection
             with self.get_db_connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute("SELECT 1")
 
-        return self._retry_operation(_connect)
+        self._retry_operation(_connect)
+        self._start_patterns_listener()
+
+    def _connection_kwargs(self) -> Dict:
+        """psycopg2.connect arguments shared by the pool and the patterns listener"""
+        return dict(
+            host=self.config.DB_HOST,
+            port=self.config.DB_PORT,
+            dbname=self.config.DB_NAME,
+            user=self.config.DB_USER,
+            password=self.config.DB_PASSWORD,
+            connect_timeout=self.operation_timeout,
+            # Every pooled connection starts with its session timeouts already set; a
+            # transaction left idle (e.g. by a crashed caller) is ended well after any
+            # gap store_results can leave while it waits on its results iterable
+            options=(
+                f"-c statement_timeout={self.operation_timeout * 1000} "
+                f"-c idle_in_transaction_session_timeout={self.operation_timeout * 10 * 1000}"
+            )
+        )
+
+    def _start_patterns_listener(self):
+        """Start the daemon thread that drops the patterns cache on NOTIFY, once per helper"""
+        with self._patterns_lock:
+            if self._patterns_listener is not None and self._patterns_listener.is_alive():
+                return
+            self._patterns_listener = threading.Thread(
+                target=self._listen_for_pattern_changes, name="patterns-listener", daemon=True
+            )
+            self._patterns_listener.start()
+
+    def _listen_for_pattern_changes(self):
+        """LISTEN on a dedicated connection, outside the pool, until the helper is closed.
+        If the listener fails, PATTERNS_CACHE_TTL still bounds how stale the cache gets"""
+        try:
+            conn = psycopg2.connect(**self._connection_kwargs())
+        except Exception as e:
+            print(f"Warning: Could not start patterns listener: {str(e)}")
+            return
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {PATTERNS_CHANNEL}")
+            while self.pool is not None:
+                if select.select([conn], [], [], self.PATTERNS_CACHE_TTL) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    conn.notifies.clear()
+                    self._invalidate_patterns()
+        except Exception as e:
+            print(f"Warning: Patterns listener stopped: {str(e)}")
+        finally:
+            conn.close()
+
+    def _invalidate_patterns(self):
+        with self._patterns_lock:
+            self._patterns_cache = None
 
     def get_connection(self):
         """Get a connection from the pool"""
-        if not self.pool:
-            self.connect()
-        return self.pool.getconn()
+        if self.pool is None:
+            with self._init_lock:
+                # Re-check: another thread may have built the pool while we waited
+                if self.pool is None:
+                    self.connect()
+        slots = self._conn_slots
+        if not slots.acquire(timeout=self.operation_timeout):
+            raise PoolTimeoutError("Timed out waiting for a free database connection")
+        try:
+            return self.pool.getconn()
+        except Exception:
+            slots.release()
+            raise
 
     def return_connection(self, conn):
         """Return a connection to the pool"""
         if self.pool:
             self.pool.putconn(conn)
+            self._conn_slots.release()
+
+    def _store_batch(self, cur, batch: List[ShareResult], session_id: int) -> tuple[int, int]:
+        """Insert one batch of results on an open cursor; the caller commits"""
+        # Encode first so a result that can't be encoded fails before any round trip
+        share_rows = _encode_share_rows(batch, session_id)
+        # Allocate the batch's ids in one round trip, then COPY the shares with them
+        cur.execute(_SQL_ALLOCATE_SHARE_IDS, (len(batch),))
+        share_ids = [row[0] for row in cur.fetchall()]
+        _copy_expert(cur, _SQL_COPY_SHARES, io.BytesIO(_shares_copy(share_ids, share_rows)))
+
+        root_files_batch = []
+        for share_id, result in zip(share_ids, batch):
+            for root_file in result.root_files or ():
+                root_files_batch.append((
+                    share_id,
+                    str(root_file['name'])[:255],
+                    root_file['type'],
+                    root_file['size'],
+                    root_file['attributes'],
+                    root_file['created'],
+                    root_file['modified']
+                ))
+
+        if root_files_batch:
+            execute_values(cur, _SQL_INSERT_ROOT_FILES, root_files_batch, page_size=self.batch_size)
+            print(f"Stored {len(root_files_batch)} root files for {len(share_ids)} shares")
+
+        sensitive_count = sum(len(result.sensitive_files or ()) for result in batch)
+        if sensitive_count:
+            # No ids needed back, so stream the rows with COPY
+            _copy_expert(cur, _SQL_COPY_SENSITIVE_FILES, _CopyReader(_sensitive_file_rows(share_ids, batch)))
+
+        return len(share_ids), sensitive_count
+
+    def store_results(self, results: Iterable[ShareResult], session_id: int) -> tuple[int, int]:
+        """Store scan results with one transaction per batch, so a bad batch is
+        rolled back and skipped without losing the others. Results may be any
+        iterable, e.g. a generator fed by the scanner; only the batch being
+        stored is held in memory"""
+        it = iter(results)
+        total_stored = 0
+        total_sensitive = 0
 
-    def store_results(self, results: List[ShareResult], session_id: int) -> tuple[int, int]:
-        """Store scan results in batches with retry mechanism"""
-        def _store_batch(batch: List[ShareResult]) -> tuple[int, int]:
+        def _store_one(batch: List[ShareResult]) -> tuple[int, int]:
             with self.get_db_connection() as conn:
                 with conn.cursor() as cur:
-                    # Set statement timeout
-                    cur.execute(f"SET statement_timeout = {self.operation_timeout * 1000}")
-                    
-                    stored_count = 0
-                    sensitive_count = 0
-
-                    for result in batch:
-                        try:
-                            # Insert share info with parameter validation
-                            hostname = str(result.hostname)[:255]  # Truncate if too long
-                            share_name = str(result.share_name)[:255]
-                            
-                            cur.execute("""
-                                INSERT INTO shares
-                                (hostname, share_name, access_level, error_message,
-                                 total_files, total_dirs, hidden_files, scan_time, session_id)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                RETURNING id
-                            """, (
-                                hostname,
-                                share_name,
-                                result.access_level.value,
-                                result.error_message,
-                                max(0, getattr(result, 'total_files', 0)),  # Ensure non-negative
-                                max(0, getattr(result, 'total_dirs', 0)),
-                                max(0, getattr(result, 'hidden_files', 0)),
-                                result.scan_time,
-                                session_id
-                            ))
-
-                            share_id = cur.fetchone()[0]
-                            stored_count += 1
-
-                            # Add root files storage
-                            if hasattr(result, 'root_files') and result.root_files:
-                                root_files_batch = []
-                                for root_file in result.root_files:
-                                    root_files_batch.append((
-                                        share_id,
-                                        str(root_file['name'])[:255],
-                                        root_file['type'],
-                                        root_file['size'],
-                                        root_file['attributes'],
-                                        root_file['created'],
-                                        root_file['modified']
-                                    ))
-                                
-                                if root_files_batch:
-                                    execute_values(cur, """
-                                        INSERT INTO root_files
-                                        (share_id, file_name, file_type, file_size, attributes, created_time, modified_time)
-                                        VALUES %s
-                                    """, root_files_batch)
-                                    print(f"Stored {len(root_files_batch)} root files for share {share_id}")
-
-                            # Store sensitive files in batches
-                            if result.sensitive_files:
-                                sensitive_files_batch = []
-                                for sensitive_file in result.sensitive_files:
-                                    # Validate and truncate data
-                                    file_path = str(sensitive_file['path'])[:4096]
-                                    file_name = str(sensitive_file['filename'])[:255]
-                                    detection_type = str(sensitive_file['type'])[:50]
-                                    
-                                    sensitive_files_batch.append(
-                                        (share_id, file_path, file_name, detection_type)
-                                    )
-                                    
-                                    if len(sensitive_files_batch) >= self.batch_size:
-                                        execute_values(cur, """
-                                            INSERT INTO sensitive_files
-                                            (share_id, file_path, file_name, detection_type)
-                                            VALUES %s
-                                        """, sensitive_files_batch)
-                                        sensitive_count += len(sensitive_files_batch)
-                                        sensitive_files_batch = []
-                                
-                                if sensitive_files_batch:
-                                    execute_values(cur, """
-                                        INSERT INTO sensitive_files
-                                        (share_id, file_path, file_name, detection_type)
-                                        VALUES %s
-                                    """, sensitive_files_batch)
-                                    sensitive_count += len(sensitive_files_batch)
-
-                        except Exception as e:
-                            print(f"Error processing result for {result.hostname}: {str(e)}")
-                            continue
-
+                    # Don't wait for the WAL flush on commit: a server crash can lose the last
+                    # few hundred ms of stored results, but never corrupts or half-applies them
+                    cur.execute("SET LOCAL synchronous_commit = off")
+                    try:
+                        stored, sensitive = self._store_batch(cur, batch, session_id)
+                    except psycopg2.OperationalError:
+                        raise  # Connection-level; retry the batch
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"Error storing batch of {len(batch)} results: {str(e)}")
+                        return 0, 0
                     conn.commit()
-                    return stored_count, sensitive_count
+            return stored, sensitive
 
-        # Process results in batches
-        total_stored = 0
-        total_sensitive = 0
-        
-        for i in range(0, len(results), self.batch_size):
-            batch = results[i:i + self.batch_size]
-            stored, sensitive = self._retry_operation(_store_batch, batch)
+        # Nothing to store: the loop never takes a connection
+        while batch := list(islice(it, self.batch_size)):
+            # A retry replays just this batch; committed batches are released
+            stored, sensitive = self._retry_operation(_store_one, batch)
             total_stored += stored
             total_sensitive += sensitive
-            
+
         return total_stored, total_sensitive
 
     def close(self):
@@ -342,85 +629,125 @@ class DatabaseHelper:
 
     def start_scan_session(self, domain: str) -> int:
         """Start a new scan session and return its ID"""
-        with self.get_db_connection() as conn:
+        with self.get_prepared_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO scan_sessions (domain, scan_status)
-                    VALUES (%s, 'running')
-                    RETURNING id
-                """, (domain,))
+                cur.execute("EXECUTE start_scan_session (%s)", (domain,))
                 session_id = cur.fetchone()[0]
                 conn.commit()
                 return session_id
 
-    def end_scan_session(self, session_id: int, total_hosts: int, total_shares: int, total_sensitive: int):
-        """Mark a scan session as complete with statistics"""
-        with self.get_db_connection() as conn:
+    def end_scan_session(self, session_id: int, total_hosts: int):
+        """Mark a scan session as complete with statistics; share and sensitive
+        file totals are counted from the stored rows"""
+        with self.get_prepared_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE scan_sessions 
-                    SET end_time = CURRENT_TIMESTAMP,
-                        total_hosts = %s,
-                        total_shares = %s,
-                        total_sensitive_files = %s,
-                        scan_status = 'completed'
-                    WHERE id = %s
-                """, (total_hosts, total_shares, total_sensitive, session_id))
+                cur.execute("EXECUTE end_scan_session (%s, %s)", (total_hosts, session_id))
                 conn.commit()
 
+        # The session's results are loaded; index them now if this database lacks the indexes
+        try:
+            self.ensure_indexes()
+        except Exception as e:
+            print(f"Warning: Could not ensure indexes: {str(e)}")
+
     def get_sensitive_patterns(self) -> List[Dict]:
-        """Get all sensitive patterns"""
-        with self.get_db_connection() as conn:
+        """Get all sensitive patterns; served from cache for up to PATTERNS_CACHE_TTL
+        seconds, or until the sensitive_patterns trigger NOTIFYs a change"""
+        with self._patterns_lock:
+            cached = self._patterns_cache
+        if cached is not None and time.monotonic() - cached[0] < self.PATTERNS_CACHE_TTL:
+            return list(cached[1])
+
+        with self.get_prepared_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT id, pattern, type, description, enabled, 
-                           created_at, updated_at
-                    FROM sensitive_patterns
-                    ORDER BY type, pattern
-                """)
+                cur.execute("EXECUTE select_patterns")
                 columns = [desc[0] for desc in cur.description]
-                return [dict(zip(columns, row)) for row in cur.fetchall()]
+                rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+        with self._patterns_lock:
+            self._patterns_cache = (time.monotonic(), rows)
+        return list(rows)
 
     def add_sensitive_pattern(self, pattern: str, type: str, description: str) -> Dict:
         """Add a new sensitive pattern"""
-        with self.get_db_connection() as conn:
+        with self.get_prepared_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO sensitive_patterns (pattern, type, description)
-                    VALUES (%s, %s, %s)
-                    RETURNING id, pattern, type, description, enabled, 
-                              created_at, updated_at
-                """, (pattern, type, description))
+                cur.execute("EXECUTE insert_pattern (%s, %s, %s)", (pattern, type, description))
                 columns = [desc[0] for desc in cur.description]
                 result = cur.fetchone()
                 conn.commit()
-                return dict(zip(columns, result))
+        self._invalidate_patterns()
+        return dict(zip(columns, result))
 
     def update_sensitive_pattern(self, id: int, pattern: str, type: str, 
                                description: str, enabled: bool) -> Dict:
         """Update an existing sensitive pattern"""
-        with self.get_db_connection() as conn:
+        with self.get_prepared_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE sensitive_patterns 
-                    SET pattern = %s, type = %s, description = %s, 
-                        enabled = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                    RETURNING id, pattern, type, description, enabled, 
-                              created_at, updated_at
-                """, (pattern, type, description, enabled, id))
+                cur.execute("EXECUTE update_pattern (%s, %s, %s, %s, %s)",
+                            (pattern, type, description, enabled, id))
                 columns = [desc[0] for desc in cur.description]
                 result = cur.fetchone()
                 conn.commit()
-                return dict(zip(columns, result))
+        self._invalidate_patterns()
+        return dict(zip(columns, result))
 
     def delete_sensitive_pattern(self, id: int) -> bool:
         """Delete a sensitive pattern"""
-        with self.get_db_connection() as conn:
+        with self.get_prepared_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    DELETE FROM sensitive_patterns WHERE id = %s
-                """, (id,))
+                cur.execute("EXECUTE delete_pattern (%s)", (id,))
                 deleted = cur.rowcount > 0
                 conn.commit()
-                return deleted
\ No newline at end of file
+        self._invalidate_patterns()
+        return deleted
+
+    def update_sensitive_patterns(self, rows: List[tuple]) -> List[Dict]:
+        """Update several patterns in one statement; rows are
+        (id, pattern, type, description, enabled) tuples"""
+        if not rows:
+            return []
+        with self.get_db_connection() as conn:
+            with conn.cursor() as cur:
+                updated = execute_values(cur, """
+                    UPDATE sensitive_patterns AS p
+                    SET pattern = v.pattern, type = v.type, description = v.description,
+                        enabled = v.enabled, updated_at = CURRENT_TIMESTAMP
+                    FROM (VALUES %s) AS v (id, pattern, type, description, enabled)
+                    WHERE p.id = v.id
+                    RETURNING p.id, p.pattern, p.type, p.description, p.enabled,
+                              p.created_at, p.updated_at
+                """, rows, page_size=len(rows), fetch=True)
+                columns = [desc[0] for desc in cur.description]
+                conn.commit()
+        self._invalidate_patterns()
+        return [dict(zip(columns, row)) for row in updated]
+
+    def delete_sensitive_patterns(self, ids: List[int]) -> int:
+        """Delete several patterns in one statement; returns how many were deleted"""
+        if not ids:
+            return 0
+        with self.get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM sensitive_patterns WHERE id = ANY(%s)", (list(ids),))
+                deleted = cur.rowcount
+                conn.commit()
+        self._invalidate_patterns()
+        return deleted
+
+_shared_helpers: Dict[tuple, DatabaseHelper] = {}
+_shared_helpers_lock = threading.Lock()
+
+def get_shared_db_helper(config: Config) -> DatabaseHelper:
+    """Return a long-lived, connected DatabaseHelper for config's database.
+
+    The pool is created and init_tables() run only the first time a database
+    is seen; later callers reuse the same pooled connections."""
+    key = (config.DB_HOST, config.DB_PORT, config.DB_NAME, config.DB_USER)
+    with _shared_helpers_lock:
+        helper = _shared_helpers.get(key)
+        if helper is None:
+            helper = DatabaseHelper(config)
+            helper.connect()
+            helper.init_tables()
+            _shared_helpers[key] = helper
+        return helper
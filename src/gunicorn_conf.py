@@ -1,7 +1,19 @@
+# preload_app imports api.py in the master, before the gevent worker would
+# patch; patch here first so its locks and sockets are cooperative
+from gevent import monkey
+monkey.patch_all()
+# psycopg2's C library does its own socket I/O, which monkey patching can't
+# reach; this makes its waits yield to other greenlets instead of blocking the worker
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
 bind = "0.0.0.0:5000"
-worker_class = 'gthread'
+# gevent workers run each request (including long-lived /api/events SSE
+# streams) in a greenlet, so idle subscribers don't pin an OS thread
+worker_class = 'gevent'
+# Keep a single worker: SSE subscribers, queued scan futures and the
+# scheduler are per-process state, so extra workers would split them
 workers = 1
-threads = 4
 timeout = 120
 keepalive = 65
 worker_connections = 1000
@@ -9,10 +21,17 @@ worker_connections = 1000
 # Enable async workers
 sync_worker = False
 
+# Import the app once in the master; background threads are started per worker
+preload_app = True
+
 # Logging
 loglevel = 'debug'
 accesslog = '-'
 errorlog = '-'
 
 # Prevent buffering
-pythonunbuffered = True
\ No newline at end of file
+pythonunbuffered = True
+
+def post_fork(server, worker):
+    from api import start_background_services
+    start_background_services()
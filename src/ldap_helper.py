@@ -1,5 +1,5 @@
-from ldap3 import Server, Connection, SUBTREE, ALL, NTLM, SIMPLE, Tls, ALL_ATTRIBUTES, ANONYMOUS
-from typing import List, Optional
+from ldap3 import Server, Connection, SUBTREE, LEVEL, BASE, NONE, NTLM, SIMPLE, Tls, ALL_ATTRIBUTES, ANONYMOUS
+from typing import Dict, Iterator, List, Optional
 import ssl
 from config import Config
 import sys
@@ -7,21 +7,49 @@ import socket
 import getpass
 from contextlib import contextmanager
 import time
+import random
+import hashlib
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 class LDAPConnectionError(Exception):
     """Custom exception for LDAP connection issues"""
     pass
 
+class LDAPAuthenticationError(LDAPConnectionError):
+    """The server rejected the credentials; retrying would only risk a lockout"""
+    pass
+
+# LDAP result code for a bind with a wrong user or password
+LDAP_INVALID_CREDENTIALS = 49
+
 class LDAPHelper:
     def __init__(self, config: Config):
         self.config = config
         self.conn = None
-        self.max_retries = 3
-        self.retry_delay = 2  # seconds
+        self.max_retries = config.LDAP_CONNECT_RETRIES
+        self.retry_base_delay = config.LDAP_RETRY_BASE_DELAY
+        self.retry_max_delay = config.LDAP_RETRY_MAX_DELAY
         self.search_timeout = 300  # 5 minutes
         self.max_computers = config.MAX_COMPUTERS if hasattr(config, 'MAX_COMPUTERS') else 100000  # Make configurable
         self.page_size = 5000  # Size of each batch during pagination
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Unbind the connection, ignoring errors from an already broken socket"""
+        conn, self.conn = self.conn, None
+        if conn:
+            try:
+                conn.unbind()
+            except Exception:
+                pass
+
     @contextmanager
     def ldap_operation_timeout(self, timeout_seconds: int):
         """Context manager for LDAP operations timeout"""
@@ -32,16 +60,21 @@ class LDAPHelper:
             socket.setdefaulttimeout(None)
 
     def _retry_operation(self, operation_func, *args, **kwargs):
-        """Retry mechanism for LDAP operations"""
+        """Retry mechanism for LDAP operations with decorrelated-jitter backoff"""
         last_exception = None
+        delay = self.retry_base_delay
         for attempt in range(self.max_retries):
             try:
                 return operation_func(*args, **kwargs)
+            except LDAPAuthenticationError:
+                raise
             except Exception as e:
                 last_exception = e
                 if attempt < self.max_retries - 1:
-                    print(f"Attempt {attempt + 1} failed, retrying in {self.retry_delay} seconds...")
-                    time.sleep(self.retry_delay)
+                    print(f"Attempt {attempt + 1} failed, retrying in {delay:.2f} seconds...")
+                    time.sleep(delay)
+                    # Spread concurrent retries so they don't hit the DC in lockstep
+                    delay = min(self.retry_max_delay, random.uniform(self.retry_base_delay, delay * 3))
                 continue
         raise last_exception
 
@@ -72,7 +105,7 @@ class LDAPHelper:
 
             server = Server(
                 self.config.LDAP_SERVER,
-                get_info=ALL,
+                get_info=NONE,  # Base DN comes from config; skip the schema/DSA fetch on bind
                 use_ssl=False,
                 port=self.config.LDAP_PORT
             )
@@ -95,23 +128,9 @@ class LDAPHelper:
                 print(f"Result: {self.conn.result}")
                 raise Exception(f"Bind failed: {self.conn.result}")
 
+            # A successful bind is the connection test; the computer search reports a bad base DN
             print("Authentication successful!")
 
-            # Test the connection with a simple query
-            test_success = self.conn.search(
-                self.get_base_dn(),
-                '(objectClass=domain)',
-                SUBTREE,
-                attributes=['dc']
-            )
-
-            if test_success:
-                print("Successfully queried domain information")
-                print(f"Domain entries found: {len(self.conn.entries)}")
-            else:
-                print("Warning: Could not query domain information")
-                print(f"Last error: {self.conn.last_error}")
-
         except Exception as e:
             print(f"\nAuthentication failed: {str(e)}", file=sys.stderr)
             print("\nDebug information:", file=sys.stderr)
@@ -131,7 +150,7 @@ class LDAPHelper:
             def _connect():
                 server = Server(
                     self.config.LDAP_SERVER,
-                    get_info=ALL,
+                    get_info=NONE,  # Base DN comes from config; skip the schema/DSA fetch on bind
                     use_ssl=False,
                     port=self.config.LDAP_PORT,
                     connect_timeout=30  # 30 second connection timeout
@@ -152,21 +171,12 @@ class LDAPHelper:
                     receive_timeout=30  # 30 second receive timeout
                 )
 
+                # A successful bind is the connection test; no separate probe search
                 if not self.conn.bind():
+                    if self.conn.result.get('result') == LDAP_INVALID_CREDENTIALS:
+                        raise LDAPAuthenticationError(f"Bind failed: {self.conn.result}")
                     raise LDAPConnectionError(f"Bind failed: {self.conn.result}")
 
-                # Test connection with timeout
-                with self.ldap_operation_timeout(30):
-                    test_success = self.conn.search(
-                        self.get_base_dn(),
-                        '(objectClass=domain)',
-                        SUBTREE,
-                        attributes=['dc']
-                    )
-
-                if not test_success:
-                    raise LDAPConnectionError(f"Connection test failed: {self.conn.last_error}")
-
             return self._retry_operation(_connect)
 
         except Exception as e:
@@ -177,76 +187,139 @@ class LDAPHelper:
             print(f"Attempted user: {self.config.LDAP_USER}", file=sys.stderr)
             raise
 
+    def is_alive(self, conn: Connection) -> bool:
+        """Check that a bound connection still answers a minimal base search"""
+        try:
+            return conn.bound and conn.search(
+                self.get_base_dn(),
+                '(objectClass=*)',
+                BASE,
+                attributes=['1.1']
+            )
+        except Exception:
+            return False
+
     def get_base_dn(self) -> str:
         """Convert domain to base DN format"""
         return ','.join([f"DC={part}" for part in self.config.LDAP_DOMAIN.split('.')])
 
-    def get_computers(self, ldap_filter: str = "all", ou: Optional[str] = None) -> List[str]:
-        """Get computer list with pagination and timeout protection"""
-        try:
-            # Determine base DN
-            if ou:
-                # Check if OU already includes domain components
-                if 'DC=' in ou.upper():
-                    base_dn = ou
-                else:
-                    # Add OU prefix if not already present
-                    if not ou.upper().startswith('OU='):
-                        ou = f"OU={ou}"
-                    base_dn = f"{ou},{self.get_base_dn()}"
-            else:
-                base_dn = self.get_base_dn()
-
-            # Construct the LDAP filter
-            if ldap_filter == "all":
-                search_filter = "(objectClass=computer)"
-            else:
-                # Combine the custom filter with objectClass filter
-                search_filter = f"(&(objectClass=computer){ldap_filter})"
-
-            print(f"\nUsing base DN: {base_dn}")
-            print(f"Using search filter: {search_filter}")
-
-            entry_list = []
-            total_processed = 0
-            start_time = time.time()
-
-            with self.ldap_operation_timeout(self.search_timeout):
-                entry_generator = self.conn.extend.standard.paged_search(
-                    search_base=base_dn,
-                    search_filter=search_filter,
-                    search_scope=SUBTREE,
-                    attributes=['dNSHostName', 'name'],
-                    paged_size=self.page_size,
-                    generator=True,
-                    time_limit=self.search_timeout
-                )
-
-                batch = []
-                for entry in entry_generator:
-                    # Check timeout
-                    if time.time() - start_time > self.search_timeout:
-                        print("\nWarning: Search operation timed out")
-                        break
-
-                    # Check maximum results limit
-                    if total_processed >= self.max_computers:
+    def list_search_roots(self) -> List[str]:
+        """DNs of the OUs and containers directly under the base DN"""
+        with self.ldap_operation_timeout(self.search_timeout):
+            self.conn.search(
+                self.get_base_dn(),
+                '(|(objectClass=organizationalUnit)(objectClass=container))',
+                LEVEL,
+                attributes=['1.1']
+            )
+        return [entry.entry_dn for entry in self.conn.entries]
+
+    def _iter_computers_parallel(self, ldap_filter: str, workers: int) -> Iterator[str]:
+        """Search each top-level OU/container on its own connection, workers at a time.
+        Computers placed directly under the base DN are searched on this connection"""
+        roots = self.list_search_roots()
+        print(f"Searching {len(roots)} top-level containers with {workers} parallel connections")
+
+        def _search(root_dn: str) -> List[str]:
+            # ldap3 connections can't run concurrent operations, so each search binds its own
+            with LDAPHelper(self.config) as helper:
+                helper.connect_with_stored_credentials()
+                return list(helper.iter_computers(ldap_filter, root_dn))
+
+        seen = set()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_search, root_dn) for root_dn in roots]
+            for hostname in self.iter_computers(ldap_filter, search_scope=LEVEL):
+                if hostname not in seen:
+                    seen.add(hostname)
+                    yield hostname
+            for future in futures:
+                for hostname in future.result():
+                    if len(seen) >= self.max_computers:
                         print(f"\nWarning: Reached maximum computer limit of {self.max_computers}")
-                        break
-
-                    if 'attributes' in entry:
-                        hostname = entry['attributes'].get('dNSHostName') or entry['attributes'].get('name')
-                        if hostname:
-                            batch.append(str(hostname))
-                            total_processed += 1
+                        return
+                    if hostname not in seen:
+                        seen.add(hostname)
+                        yield hostname
+
+    def iter_computers(self, ldap_filter: str = "all", ou: Optional[str] = None,
+                       search_scope: str = SUBTREE) -> Iterator[str]:
+        """Yield computer hostnames as paged search results arrive, without buffering them"""
+        # Determine base DN
+        if ou:
+            # Check if OU already includes domain components
+            if 'DC=' in ou.upper():
+                base_dn = ou
+            else:
+                # Add OU prefix if not already present
+                if not ou.upper().startswith('OU='):
+                    ou = f"OU={ou}"
+                base_dn = f"{ou},{self.get_base_dn()}"
+        else:
+            base_dn = self.get_base_dn()
 
-                        if len(batch) >= self.page_size:
-                            entry_list.extend(batch)
-                            print(f"Processed {len(entry_list)} computers...")
-                            batch = []
+        # Construct the LDAP filter
+        if ldap_filter == "all":
+            search_filter = "(objectClass=computer)"
+        else:
+            # Combine the custom filter with objectClass filter
+            search_filter = f"(&(objectClass=computer){ldap_filter})"
+
+        print(f"\nUsing base DN: {base_dn}")
+        print(f"Using search filter: {search_filter}")
+
+        total_processed = 0
+        max_computers = self.max_computers
+        page_size = self.page_size
+        deadline = time.monotonic() + self.search_timeout
+
+        with self.ldap_operation_timeout(self.search_timeout):
+            entry_generator = self.conn.extend.standard.paged_search(
+                search_base=base_dn,
+                search_filter=search_filter,
+                search_scope=search_scope,
+                attributes=['dNSHostName', 'name'],
+                paged_size=self.page_size,
+                generator=True,
+                time_limit=self.search_timeout
+            )
 
-                if batch:
-                    entry_list.extend(batch)
+            for entries_read, entry in enumerate(entry_generator, 1):
+                # Check timeout once per page; monotonic so clock adjustments can't trip it
+                if entries_read % page_size == 0 and time.monotonic() > deadline:
+                    print("\nWarning: Search operation timed out")
+                    return
+
+                # Check maximum results limit
+                if total_processed >= max_computers:
+                    print(f"\nWarning: Reached maximum computer limit of {max_computers}")
+                    return
+
+                attributes = entry.get('attributes')
+                if attributes is not None:
+                    get = attributes.get
+                    hostname = get('dNSHostName') or get('name')
+                    # Without the schema ldap3 can't tell single-valued attributes apart
+                    if isinstance(hostname, list):
+                        hostname = hostname[0] if hostname else None
+                    if hostname:
+                        total_processed += 1
+                        yield str(hostname)
+
+    def get_computers(self, ldap_filter: str = "all", ou: Optional[str] = None,
+                      parallel: int = 1) -> List[str]:
+        """Get computer list with pagination and timeout protection. With parallel > 1
+        and no ou, top-level containers are searched concurrently"""
+        entry_list = []
+        try:
+            if parallel > 1 and not ou:
+                hostnames = self._iter_computers_parallel(ldap_filter, parallel)
+            else:
+                hostnames = self.iter_computers(ldap_filter, ou)
+            for hostname in hostnames:
+                entry_list.append(hostname)
+                if len(entry_list) % self.page_size == 0:
+                    print(f"Processed {len(entry_list)} computers...")
 
             print(f"\nFound {len(entry_list)} computers")
             if entry_list:
@@ -263,4 +336,50 @@ class LDAPHelper:
             print(f"\nError during computer search: {str(e)}", file=sys.stderr)
             print(f"Last error from LDAP: {self.conn.last_error}", file=sys.stderr)
             print(f"Response: {self.conn.result}", file=sys.stderr)
-            raise
\ No newline at end of file
+            raise
+
+class LDAPConnectionPool:
+    """Keeps bound LDAP connections for reuse across scans that use the same
+    server, domain and credentials"""
+
+    def __init__(self, max_idle: int = 4):
+        self.max_idle = max_idle  # Idle connections kept per server/credential set
+        self._queues: Dict[tuple, queue.Queue] = {}
+        self._lock = threading.Lock()
+
+    def _get_queue(self, config: Config) -> queue.Queue:
+        # Key on a password hash so a changed password never reuses an old bind
+        password_hash = hashlib.sha256((config.LDAP_PASSWORD or '').encode()).hexdigest()
+        key = (config.LDAP_SERVER, config.LDAP_PORT, config.LDAP_DOMAIN, config.LDAP_USER, password_hash)
+        with self._lock:
+            return self._queues.setdefault(key, queue.Queue(maxsize=self.max_idle))
+
+    def get(self, config: Config) -> LDAPHelper:
+        """Return an LDAPHelper for config with a live, bound connection"""
+        helper = LDAPHelper(config)
+        idle = self._get_queue(config)
+        while True:
+            try:
+                conn = idle.get_nowait()
+            except queue.Empty:
+                break
+            if helper.is_alive(conn):
+                helper.conn = conn
+                return helper
+            try:
+                conn.unbind()
+            except Exception:
+                pass
+
+        helper.connect_with_stored_credentials()
+        return helper
+
+    def release(self, helper: LDAPHelper) -> None:
+        """Return a helper's connection to the pool"""
+        if not helper.conn:
+            return
+        try:
+            self._get_queue(helper.config).put_nowait(helper.conn)
+            helper.conn = None
+        except queue.Full:
+            helper.close()
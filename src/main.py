@@ -8,7 +8,7 @@ import getpass
 from typing import Optional
 import signal
 import sys
-from contextlib import contextmanager
+from contextlib import contextmanager, ExitStack
 import time
 
 app = typer.Typer()
@@ -87,12 +87,16 @@ def main(
     scan_timeout: int = typer.Option(30, "--scan-timeout", help="Timeout for individual share scans in seconds (default: 30)"),
     host_timeout: int = typer.Option(300, "--host-timeout", help="Timeout for entire host scan in seconds (default: 300)"),
     max_computers: int = typer.Option(800000, "--max-computers", 
-        help="Maximum number of computers to process (default: 800000)")
+        help="Maximum number of computers to process (default: 800000)"),
+    ldap_parallel: int = typer.Option(1, "--ldap-parallel",
+        help="Search top-level OUs over this many LDAP connections when --ou is not set (default: 1)")
 ):
     """
     Share Scanner - Enumerate and analyze network shares
     """
     start_time = time.time()
+    # Closes whichever helpers were created, even if setup fails part way
+    helpers = ExitStack()
     
     try:
         # Validate input parameters
@@ -119,8 +123,8 @@ def main(
         # Initialize helpers with connection timeout
         try:
             with timeout(30):  # 30-second timeout for initial connections
-                ldap_helper = LDAPHelper(config)
-                db_helper = DatabaseHelper(config)
+                ldap_helper = helpers.enter_context(LDAPHelper(config))
+                db_helper = helpers.enter_context(DatabaseHelper(config))
                 db_helper.connect()
                 db_helper.init_tables()
                 scanner = ShareScanner(config, db_helper)
@@ -137,7 +141,7 @@ def main(
         # Get computers list with timeout
         try:
             with timeout(60):  # 60-second timeout for LDAP query
-                computers = ldap_helper.get_computers(ldap_filter=filter, ou=ou)
+                computers = ldap_helper.get_computers(ldap_filter=filter, ou=ou, parallel=ldap_parallel)
         except TimeoutError:
             raise ConnectionError("LDAP query timed out")
 
@@ -167,9 +171,7 @@ def main(
                 # Update scan session with final statistics
                 db_helper.end_scan_session(
                     session_id,
-                    total_hosts=total_hosts,
-                    total_shares=scanner.total_shares_processed,
-                    total_sensitive=scanner.total_sensitive_files
+                    total_hosts=total_hosts
                 )
                 
         except KeyboardInterrupt:
@@ -177,9 +179,7 @@ def main(
             # Update scan session as interrupted
             db_helper.end_scan_session(
                 session_id,
-                total_hosts=len(computers),
-                total_shares=scanner.total_shares_processed,
-                total_sensitive=scanner.total_sensitive_files
+                total_hosts=len(computers)
             )
             sys.exit(1)
 
@@ -196,9 +196,9 @@ def main(
     finally:
         # Cleanup and display summary
         try:
-            db_helper.close()
-        except:
-            pass
+            helpers.close()
+        except Exception as e:
+            console.print(f"[yellow]Error during cleanup: {str(e)}[/yellow]")
         
         elapsed_time = time.time() - start_time
         console.print(f"\n[green]Scan completed in {elapsed_time:.2f} seconds[/green]")
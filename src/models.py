@@ -16,3 +16,8 @@ class ShareResult:
     error_message: Optional[str] = None
     sensitive_files: List[Dict] = None
     scan_time: str = None
+    # Same shape as scanner.ShareDetails so the DB layer can read fields directly
+    root_files: List[Dict] = None
+    total_files: int = 0
+    total_dirs: int = 0
+    hidden_files: int = 0
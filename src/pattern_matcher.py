@@ -1,7 +1,14 @@
 import re
+from functools import lru_cache
 from typing import Dict, List, Tuple
 from dataclasses import dataclass
 
+# A pattern that only matches a file extension, e.g. \.kdbx$
+_EXTENSION_PATTERN = re.compile(r'^\\\.(\w+)\$$')
+# Group references: numbered (\1), named ((?P=name)) and conditional ((?(1)...)). Joined
+# into one regex they would point at another pattern's groups without raising re.error
+_GROUP_REFERENCE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+
 @dataclass
 class SensitivePattern:
     pattern: str
@@ -9,6 +16,8 @@ class SensitivePattern:
     description: str
 
 class PatternMatcher:
+    MATCH_CACHE_SIZE = 65536  # Distinct file names remembered between refreshes
+
     def __init__(self, db_helper=None):
         self.db_helper = db_helper
         self.patterns = []
@@ -28,22 +37,65 @@ class PatternMatcher:
                 for p in patterns if p['enabled']
             ]
             
-            # Update compiled patterns
-            self.compiled_patterns = [
-                (re.compile(p.pattern, re.IGNORECASE), p.type, p.description)
-                for p in self.patterns
-            ]
-            
-            # Update combined pattern
-            if self.patterns:
-                self.combined_pattern = re.compile('|'.join(
-                    f'({p.pattern})' for p in self.patterns
-                ), re.IGNORECASE)
-            else:
-                self.combined_pattern = re.compile(r'$^')  # Match nothing
         else:
             # Fallback to default patterns if no database connection
             self._init_default_patterns()
+        self._compile()
+
+    def _compile(self):
+        """Build the regexes check_filename uses from self.patterns"""
+        # Plain extension patterns like \.pem$ become one dict lookup per name
+        # instead of regex work; only the rest go into the compiled regexes
+        self.extension_matches: Dict[str, List[Tuple[str, str]]] = {}
+        regex_patterns = []
+        for p in self.patterns:
+            extension = _EXTENSION_PATTERN.match(p.pattern)
+            if extension:
+                self.extension_matches.setdefault(f'.{extension.group(1).lower()}', []).append((p.type, p.description))
+            else:
+                regex_patterns.append(p)
+
+        # Update compiled patterns
+        self.compiled_patterns = [
+            (re.compile(p.pattern, re.IGNORECASE), p.type, p.description)
+            for p in regex_patterns
+        ]
+        self.pattern_meta = [(p.type, p.description) for p in regex_patterns]
+
+        # Update combined pattern
+        self.combined_pattern = None
+        self.match_all_pattern = None
+        if not regex_patterns:
+            self.combined_pattern = re.compile(r'$^')  # Match nothing
+        # A group reference would resolve against another pattern's groups in the
+        # joined regexes, silently changing results; such pattern sets leave both
+        # unset so only the exact per-pattern loop runs
+        elif not any(_GROUP_REFERENCE.search(p.pattern) for p in regex_patterns):
+            try:
+                self.combined_pattern = re.compile('|'.join(
+                    f'({p.pattern})' for p in regex_patterns
+                ), re.IGNORECASE)
+
+                # One optional lookahead per pattern, all evaluated by a single match() at
+                # position 0: group gN is set iff pattern N occurs anywhere in the name, so
+                # every matching pattern is found in one C-level pass
+                self.match_all_pattern = re.compile(''.join(
+                    f'(?:(?=.*?(?P<g{i}>{p.pattern})))?' for i, p in enumerate(regex_patterns)
+                ), re.IGNORECASE | re.DOTALL)
+                # Patterns may have groups of their own; map each gN to its index in groups()
+                self.match_all_slots = [
+                    (self.match_all_pattern.groupindex[f'g{i}'] - 1, meta)
+                    for i, meta in enumerate(self.pattern_meta)
+                ]
+            except re.error:
+                # e.g. two patterns defining the same group name, or inline global flags
+                self.combined_pattern = None
+                self.match_all_pattern = None
+
+        # Names like desktop.ini or passwords.txt recur across hosts and shares. Results
+        # are cached per compiled pattern set, so a refresh starts with an empty cache;
+        # matching ignores case, so case variants share an entry
+        self._cached_match = lru_cache(maxsize=self.MATCH_CACHE_SIZE)(self._match)
     
     def _init_default_patterns(self):
         """Initialize with default patterns"""
@@ -54,9 +106,21 @@ class PatternMatcher:
         # ... rest of initialization ...
     
     def check_filename(self, filename: str) -> List[Tuple[str, str]]:
-        matches = []
-        if self.combined_pattern.search(filename):
-            for pattern, type_, desc in self.compiled_patterns:
-                if pattern.search(filename):
-                    matches.append((type_, desc))
-        return matches 
\ No newline at end of file
+        return list(self._cached_match(filename.lower()))
+
+    def _match(self, filename: str) -> Tuple[Tuple[str, str], ...]:
+        """Match a lower-cased file name"""
+        dot = filename.rfind('.')
+        matches = tuple(self.extension_matches.get(filename[dot:], ())) if dot >= 0 else ()
+        # The combined alternation rejects most names in one search; unset when the
+        # patterns can't be joined, and then every name takes the per-pattern loop
+        if self.combined_pattern is not None and not self.combined_pattern.search(filename):
+            return matches
+        if self.match_all_pattern is not None:
+            groups = self.match_all_pattern.match(filename).groups()
+            return matches + tuple(meta for slot, meta in self.match_all_slots if groups[slot] is not None)
+        return matches + tuple(
+            (type_, desc)
+            for pattern, type_, desc in self.compiled_patterns
+            if pattern.search(filename)
+        ) 
\ No newline at end of file
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+import logging
+from typing import Optional
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Active scans are stored one row per scan in a WAL-mode SQLite database, with
+# status and progress in their own columns so progress ticks rewrite only one
+# small column instead of re-serializing the whole scan record
+SCANS_DB = "scans.db"
+SCAN_RETENTION_HOURS = 24
+SCAN_RETENTION_SECONDS = SCAN_RETENTION_HOURS * 3600
+SCAN_CLEANUP_INTERVAL = 60  # seconds
+
+_SCANS_LOCK = threading.Lock()
+_scans_db = None
+_scans_db_pid = None
+
+def _conn() -> sqlite3.Connection:
+    """Return this process's SQLite connection, opening it on first use.
+
+    With preload_app the module is imported in the gunicorn master; SQLite
+    connections must not cross fork(), so each process opens its own.
+    Callers hold _SCANS_LOCK."""
+    global _scans_db, _scans_db_pid
+    pid = os.getpid()
+    if _scans_db is None or _scans_db_pid != pid:
+        conn = sqlite3.connect(SCANS_DB, check_same_thread=False, isolation_level=None)
+        conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA busy_timeout=5000;
+            CREATE TABLE IF NOT EXISTS scan_status (
+                scan_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                progress TEXT,
+                extra TEXT NOT NULL DEFAULT '{}',
+                ts REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_scan_status_ts ON scan_status(ts);
+        """)
+        _scans_db, _scans_db_pid = conn, pid
+    return _scans_db
+
+def _dumps(value) -> Optional[str]:
+    return None if value is None else orjson.dumps(value).decode()
+
+def get_scan(scan_id) -> Optional[dict]:
+    """Load a single scan's public status fields, or None if it does not exist"""
+    with _SCANS_LOCK:
+        row = _conn().execute(
+            """SELECT status, progress, json_extract(extra, '$.error'), json_extract(extra, '$.started_at'), ts
+               FROM scan_status WHERE scan_id = ?""",
+            (scan_id,)
+        ).fetchone()
+    if not row:
+        return None
+    scan_data = {
+        'status': row[0],
+        'progress': orjson.loads(row[1]) if row[1] else None
+    }
+    if row[2] is not None:
+        scan_data['error'] = row[2]
+    if row[3] is not None:
+        scan_data['started_at'] = row[3]
+    # ts is only bumped by writes, so it tracks the scan's own activity, not polling
+    scan_data['last_activity'] = datetime.fromtimestamp(row[4]).isoformat()
+    return scan_data
+
+def save_scan(scan_id, scan_data):
+    """Insert or replace a scan's status and reset its timestamp"""
+    extra = {k: v for k, v in scan_data.items() if k not in ('status', 'progress')}
+    with _SCANS_LOCK:
+        _conn().execute(
+            "INSERT OR REPLACE INTO scan_status (scan_id, status, progress, extra, ts) VALUES (?, ?, ?, ?, ?)",
+            (scan_id, scan_data['status'], _dumps(scan_data.get('progress')), _dumps(extra), time.time())
+        )
+
+def update_scan_progress(scan_id, progress):
+    """Replace only the progress column; the hot path during a scan"""
+    with _SCANS_LOCK:
+        _conn().execute(
+            "UPDATE scan_status SET progress = ?, ts = ? WHERE scan_id = ?",
+            (_dumps(progress), time.time(), scan_id)
+        )
+
+def update_scan_status(scan_id, status_data):
+    """Merge status_data into an existing scan in a single UPDATE"""
+    status_data = dict(status_data)
+    status = status_data.pop('status', None)
+    progress = status_data.pop('progress', None)
+    with _SCANS_LOCK:
+        _conn().execute(
+            """UPDATE scan_status SET
+                   status = COALESCE(?, status),
+                   progress = COALESCE(?, progress),
+                   extra = json_patch(extra, ?),
+                   ts = ?
+               WHERE scan_id = ?""",
+            (status, _dumps(progress), _dumps(status_data), time.time(), scan_id)
+        )
+
+def cleanup_old_scans():
+    """Remove scans with no progress or status change in the last SCAN_RETENTION_HOURS"""
+    with _SCANS_LOCK:
+        # One precomputed threshold; the range delete on idx_scan_status_ts only visits expired rows
+        _conn().execute(
+            "DELETE FROM scan_status WHERE ts < ?",
+            (time.time() - SCAN_RETENTION_SECONDS,)
+        )
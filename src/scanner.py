@@ -1,6 +1,7 @@
 from impacket.smbconnection import SMBConnection, SessionError
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Optional, Set
+from typing import Collection, List, Dict, Optional, Set
+from itertools import islice
 import csv
 from datetime import datetime
 import os
@@ -44,6 +45,13 @@ class ShareResult:
     scan_time: str = None
 
 class ShareDetails:
+    # Fixed record layout: no per-share __dict__ while results queue up for storage
+    __slots__ = (
+        'hostname', 'share_name', 'access_level', 'error_message', 'root_files',
+        'share_permissions', 'total_files', 'total_dirs', 'hidden_files',
+        'sensitive_files', 'scan_time'
+    )
+
     def __init__(self, hostname: str, share_name: str, access_level: ShareAccess):
         self.hostname = hostname
         self.share_name = share_name
@@ -332,20 +340,19 @@ class ShareScanner:
         
         return sensitive_files
 
-    def scan_network(self, hosts: List[str]) -> None:
-        valid_hosts = [h for h in hosts if h and h != "[]"]
-        total_hosts = len(valid_hosts)
+    def scan_network(self, hosts: Collection[str]) -> None:
+        """Scan hosts batch by batch; batches are cut from hosts without copying it"""
+        valid_hosts = (h for h in hosts if h and h != "[]")
+        total_hosts = sum(1 for h in hosts if h and h != "[]")
+        ShareScanner.console.print(f"\n[bold]Starting scan of {total_hosts} hosts[/bold]")
         processed_hosts = 0
         
-        ShareScanner.console.print(f"\n[bold]Starting scan of {total_hosts} hosts[/bold]")
         ShareScanner.console.print(f"[bold]Threads:[/bold] {self.config.DEFAULT_THREADS}")
         ShareScanner.console.print(f"[bold]Timeouts:[/bold] Host={self.config.HOST_SCAN_TIMEOUT}s, Share={self.config.SCAN_TIMEOUT}s\n")
         
         storage_batch = []
         
-        for i in range(0, total_hosts, self.batch_size):
-            batch = valid_hosts[i:i + self.batch_size]
-            
+        while batch := list(islice(valid_hosts, self.batch_size)):
             with ThreadPoolExecutor(max_workers=self.config.DEFAULT_THREADS) as executor:
                 future_to_host = {
                     executor.submit(self._scan_host_wrapper, host): host 
@@ -366,10 +373,11 @@ class ShareScanner:
                             storage_batch.extend(result['shares'])
                             
                             if len(storage_batch) >= self.batch_size:
-                                shares_count, sensitive_count = self.db_helper.store_results(storage_batch, self.session_id)
+                                # Reset before storing so a failed store isn't retried with every later batch
+                                pending, storage_batch = storage_batch, []
+                                shares_count, sensitive_count = self.db_helper.store_results(pending, self.session_id)
                                 self.total_shares_processed += shares_count
                                 self.total_sensitive_files += sensitive_count
-                                storage_batch = []
                     except Exception as e:
                         ShareScanner.console.print(f"[red]Error processing {host}: {str(e)}[/red]")
 
@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pattern_matcher import PatternMatcher, SensitivePattern
+
+
+def _matcher(*patterns):
+    matcher = PatternMatcher()
+    matcher.patterns = [SensitivePattern(p, type_, type_) for p, type_ in patterns]
+    matcher._compile()
+    return matcher
+
+
+class PatternMatcherTest(unittest.TestCase):
+    def test_grouped_patterns_use_single_pass(self):
+        matcher = _matcher((r'pass(word|wd)?|secret|credential', 'credential'), (r'back(up)?', 'backup'))
+        self.assertIsNotNone(matcher.match_all_pattern)
+        self.assertEqual(matcher.check_filename('Password_backup.txt'),
+                         [('credential', 'credential'), ('backup', 'backup')])
+        self.assertEqual(matcher.check_filename('readme.txt'), [])
+
+    def test_backreference_alongside_grouped_pattern(self):
+        matcher = _matcher((r'pass(word|wd)?|secret|credential', 'credential'), (r'(\w)\1', 'double'))
+        self.assertIsNone(matcher.match_all_pattern)
+        self.assertEqual(matcher.check_filename('Password.txt'),
+                         [('credential', 'credential'), ('double', 'double')])
+        self.assertEqual(matcher.check_filename('aa'), [('double', 'double')])
+        self.assertEqual(matcher.check_filename('xy'), [])
+
+    def test_extension_pattern(self):
+        matcher = _matcher((r'\.kdbx$', 'keystore'), (r'secret', 'credential'))
+        self.assertEqual(matcher.check_filename('Secret.KDBX'),
+                         [('keystore', 'keystore'), ('credential', 'credential')])
+
+
+if __name__ == '__main__':
+    unittest.main()